@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Binary array transport for talking to the Sound Hunter components.
+
+Tesseract accepts arrays either as nested JSON lists or as a base64
+encoded buffer of raw little-endian values. The latter avoids building
+one Python float per sample on both ends of the wire, so every array we
+send goes out as a float32 buffer and comes back through np.frombuffer.
+"""
+
+import base64
+import numpy as np
+
+from metrics import get_metrics
+
+metrics = get_metrics("transport")
+
+# Wire dtype for every audio / feature array
+WIRE_DTYPE = np.dtype("<f4")
+
+def encode_array(arr):
+    """Encode an array as a Tesseract base64 array payload"""
+    arr = np.ascontiguousarray(arr, dtype=WIRE_DTYPE)
+    return {
+        "shape": list(arr.shape),
+        "dtype": "float32",
+        "data": {
+            "buffer": base64.b64encode(arr.data).decode("ascii"),
+            "encoding": "base64"
+        }
+    }
+
+def decode_array(obj):
+    """Decode a Tesseract array payload (base64 or nested lists) into NumPy"""
+    if isinstance(obj, dict) and "data" in obj:
+        data = obj["data"]
+        if data.get("encoding") == "base64":
+            buffer = base64.b64decode(data["buffer"])
+            return np.frombuffer(buffer, dtype=np.dtype(obj["dtype"]).newbyteorder("<")).reshape(obj["shape"])
+        return np.asarray(data["buffer"], dtype=obj["dtype"])
+    return np.asarray(obj)
+
+def decode_payload(payload):
+    """Recursively decode every array payload in a component response"""
+    if isinstance(payload, dict):
+        if "data" in payload and "shape" in payload and "dtype" in payload:
+            return decode_array(payload)
+        return {key: decode_payload(value) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [decode_payload(value) for value in payload]
+    return payload
+
+def apply(tesseract, inputs):
+    """Call a component's apply with NumPy inputs, without going through .tolist()
+
+    The Tesseract client already base64-encodes ndarray leaves and asks for
+    json+base64 responses; this only makes sure arrays are float32 before
+    they are serialized and that outputs come back as NumPy arrays.
+    """
+    inputs = {
+        key: np.asarray(value, dtype=np.float32) if isinstance(value, np.ndarray) else value
+        for key, value in inputs.items()
+    }
+    with metrics.timer("request"):
+        result = tesseract.apply(inputs)
+    with metrics.timer("decode"):
+        return decode_payload(result)
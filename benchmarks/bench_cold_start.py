@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Time to first result of a fresh script, per pipeline backend
+
+    python benchmarks/bench_cold_start.py [--runs 3] [--backends inprocess containers pool]
+
+Each run is a new Python process that imports the pipeline, opens the
+backend and scores one clip with detect_all, the way train_system.py or
+demo_retrain.py start up. Reported per backend: wall time from process
+spawn to the first result, and how much of it went to imports, opening
+the backend and the first call. "containers" starts and stops every image
+in each run. "pool" starts them on the first run only (the pool is
+stopped beforehand), and later runs reuse the warm containers. Backends
+that cannot start here, e.g. without Docker, are reported and skipped.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import numpy as np
+from pipeline import SoundHunterPipeline
+imported = time.perf_counter()
+with SoundHunterPipeline(sys.argv[1]) as pipeline:
+    opened = time.perf_counter()
+    t = np.linspace(0, 1, 22050)
+    models = {"whistle": {"filter_params": {"low_freq": 1000.0, "high_freq": 2000.0},
+                          "target_pattern": np.ones(10, dtype=np.float32)}}
+    pipeline.detect_all(np.sin(2 * np.pi * 1500 * t), 22050, models)
+    done = time.perf_counter()
+print(json.dumps({"imports": imported - start, "open": opened - imported, "first_call": done - opened}))
+"""
+
+def run_once(backend):
+    """(wall seconds, child timings) of one fresh process, or (None, error text)"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD, backend], cwd=REPO_ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        return None, (proc.stderr.strip().splitlines() or ["exit code %d" % proc.returncode])[-1]
+    return wall, json.loads(proc.stdout.strip().splitlines()[-1])
+
+def stop_pool():
+    subprocess.run([sys.executable, "component_pool.py", "stop"], cwd=REPO_ROOT, capture_output=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first result per pipeline backend")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["inprocess", "containers", "pool"])
+    parser.add_argument("--keep-pool", action="store_true", help="leave the pool running afterwards")
+    args = parser.parse_args()
+
+    print("%-11s %4s %9s %9s %9s %11s" % ("Backend", "run", "wall s", "imports", "open", "first call"))
+    print("-" * 58)
+    for backend in args.backends:
+        if backend == "pool":
+            stop_pool()
+        walls = []
+        for run in range(1, args.runs + 1):
+            wall, timings = run_once(backend)
+            if wall is None:
+                print("%-11s %4d  skipped: %s" % (backend, run, timings))
+                break
+            walls.append(wall)
+            print("%-11s %4d %9.2f %9.2f %9.2f %11.3f" % (
+                backend, run, wall, timings["imports"], timings["open"], timings["first_call"]))
+        if len(walls) > 1:
+            print("%-11s %4s %9.2f  (median of runs 2-%d)" % (backend, "", statistics.median(walls[1:]), len(walls)))
+        if backend == "pool" and not args.keep_pool:
+            stop_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Latency and throughput of audio-filter's engines: FFT mask vs FIR vs SOS IIR
+
+Whole-signal filtering is timed at 1 s and 60 s (and 1 h with --long,
+which needs a few GB of memory for the FFT engine), followed by the
+per-chunk latency of the streaming form of each engine.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from pipeline import load_component
+
+SAMPLE_RATE = 22050
+BAND = (1000.0, 2000.0)
+ENGINES = ("fft", "fir", "butter", "cheby1")
+CHUNK = 2048
+
+def time_call(fn, repeats):
+    """Best-of-N wall time of fn() in seconds"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def whole_signal(audio_filter, engine, audio):
+    """Filter audio in one call the way apply() does for the engine"""
+    low, high = BAND
+    if engine == "fft":
+        mask = audio_filter.cached_band_mask(len(audio), SAMPLE_RATE, low, high)
+        return audio_filter.irfft(audio_filter.rfft(audio) * mask, len(audio))
+    return audio_filter.filter_signal(audio, SAMPLE_RATE, low, high, engine)
+
+def streaming_chunk_latency(audio_filter, engine, audio, repeats=200):
+    """Mean time to push one CHUNK-sample chunk through the engine's streaming filter
+
+    Overlap-save only computes once a full hop has arrived, so the mean
+    (not the median) is the representative per-chunk cost.
+    """
+    low, high = BAND
+    if engine in ("butter", "cheby1"):
+        state = audio_filter.SOSStreamingFilter(SAMPLE_RATE, low, high, kind=engine)
+    else:
+        state = audio_filter.StreamingFilter(SAMPLE_RATE, low, high)
+    chunks = audio[:CHUNK * repeats].reshape(repeats, CHUNK)
+    start = time.perf_counter()
+    for chunk in chunks:
+        state.process(chunk)
+    return (time.perf_counter() - start) / repeats
+
+def main():
+    audio_filter = load_component("audio_filter")
+    durations = [1, 60] + ([3600] if "--long" in sys.argv else [])
+    rng = np.random.default_rng(0)
+
+    print("=== Filter Engine Benchmark (%d Hz, band %.0f-%.0f Hz) ===\n" % ((SAMPLE_RATE,) + BAND))
+    print("%-7s %-8s %12s %16s" % ("Signal", "Engine", "Latency ms", "Throughput Ms/s"))
+    print("-" * 46)
+    for duration in durations:
+        audio = rng.standard_normal(SAMPLE_RATE * duration).astype(np.float32)
+        repeats = 5 if duration < 3600 else 1
+        for engine in ENGINES:
+            # Warm the design caches before timing
+            whole_signal(audio_filter, engine, audio[:SAMPLE_RATE])
+            seconds = time_call(lambda: whole_signal(audio_filter, engine, audio), repeats)
+            print("%-7s %-8s %12.2f %16.1f" % ("%ds" % duration, engine, seconds * 1000.0,
+                                               len(audio) / seconds / 1e6))
+        del audio
+
+    print("\nStreaming, %d-sample chunks (%.1f ms of audio each)" % (CHUNK, CHUNK / SAMPLE_RATE * 1000.0))
+    print("%-8s %18s" % ("Engine", "Mean chunk ms"))
+    print("-" * 27)
+    audio = rng.standard_normal(CHUNK * 200)
+    for engine in ("fft", "butter", "cheby1"):
+        label = "fft/fir" if engine == "fft" else engine
+        print("%-8s %18.3f" % (label, streaming_chunk_latency(audio_filter, engine, audio) * 1000.0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Recall@k and latency of pattern-detector's PatternIndex against exact np.dot scoring"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from pipeline import load_component
+
+def synthetic_patterns(n, dim, n_clusters, rng):
+    """Clustered feature vectors, like per-site / per-device variants of a few sound classes"""
+    centers = rng.random((n_clusters, dim))
+    labels = rng.integers(0, n_clusters, n)
+    return (centers[labels] + 0.05 * rng.standard_normal((n, dim))).astype(np.float32)
+
+def exact_top_k(patterns, queries, k):
+    normalized = patterns / np.linalg.norm(patterns, axis=1, keepdims=True)
+    scores = np.dot(queries / np.linalg.norm(queries, axis=1, keepdims=True), normalized.T)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def main(dim=10, k=10, n_queries=200):
+    pattern_detector = load_component("pattern_detector")
+    rng = np.random.default_rng(0)
+
+    print("=== Pattern Index Benchmark (dim=%d, k=%d, %d queries) ===\n" % (dim, k, n_queries))
+    print("%-9s %-8s %10s %14s" % ("Patterns", "n_probe", "Recall@k", "ms / query"))
+    print("-" * 45)
+    for n in (10_000, 100_000):
+        patterns = synthetic_patterns(n, dim, 200, rng)
+        queries = synthetic_patterns(n_queries, dim, 200, rng)
+
+        start = time.perf_counter()
+        truth = exact_top_k(patterns, queries, k)
+        exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+        print("%-9d %-8s %10.3f %14.3f" % (n, "exact", 1.0, exact_ms))
+
+        start = time.perf_counter()
+        index = pattern_detector.PatternIndex(dim, exact_threshold=0)
+        index.add(patterns)
+        index.train()
+        build_s = time.perf_counter() - start
+
+        for n_probe in (1, 4, 16, 64):
+            start = time.perf_counter()
+            ids, _ = index.search(queries, k=k, n_probe=n_probe)
+            query_ms = (time.perf_counter() - start) * 1000 / n_queries
+            recall = np.mean([len(np.intersect1d(ids[q], truth[q])) / k for q in range(n_queries)])
+            print("%-9d %-8d %10.3f %14.3f" % (n, n_probe, recall, query_ms))
+        print("%-9s build: %.2f s, %d lists\n" % ("", build_s, len(index.centroids)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Bytes on the wire and decode time: .tolist() JSON vs base64 float32 buffers"""
+
+import sys
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import array_transport
+
+def time_call(fn, repeats):
+    """Best-of-N wall time of fn() in milliseconds"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+def bench_clip(duration, sample_rate=22050, repeats=5):
+    audio = np.random.randn(int(sample_rate * duration))
+
+    # Before: nested JSON list of Python floats
+    list_body = json.dumps({"audio_data": audio.tolist()})
+    list_encode = time_call(lambda: json.dumps({"audio_data": audio.tolist()}), repeats)
+    list_decode = time_call(lambda: np.array(json.loads(list_body)["audio_data"]), repeats)
+
+    # After: base64 little-endian float32 buffer
+    b64_body = json.dumps({"audio_data": array_transport.encode_array(audio)})
+    b64_encode = time_call(lambda: json.dumps({"audio_data": array_transport.encode_array(audio)}), repeats)
+    b64_decode = time_call(lambda: array_transport.decode_array(json.loads(b64_body)["audio_data"]), repeats)
+
+    return {
+        "samples": len(audio),
+        "list": (len(list_body), list_encode, list_decode),
+        "base64": (len(b64_body), b64_encode, b64_decode)
+    }
+
+def main():
+    print("=== Array Transport Benchmark ===\n")
+    print("%-9s %-8s %12s %12s %12s" % ("Clip", "Format", "Bytes", "Encode ms", "Decode ms"))
+    print("-" * 57)
+    for duration in (1, 10, 60):
+        result = bench_clip(duration)
+        for fmt in ("list", "base64"):
+            size, encode_ms, decode_ms = result[fmt]
+            print("%-9s %-8s %12d %12.2f %12.2f" % ("%ds" % duration, fmt, size, encode_ms, decode_ms))
+        list_size = result["list"][0]
+        b64_size = result["base64"][0]
+        print("%-9s %-8s %11.1fx %11.1fx %11.1fx" % (
+            "", "ratio", list_size / b64_size,
+            result["list"][1] / result["base64"][1],
+            result["list"][2] / result["base64"][2]))
+
+if __name__ == "__main__":
+    main()
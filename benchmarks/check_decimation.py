@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Accuracy and speed of audio-filter's decimate option against the full-rate path
+
+    python benchmarks/check_decimation.py [--seconds 5]
+
+Every sound class is run through each trained model's band, and through
+a few fixed bands, with SoundHunterPipeline.run. This happens once at
+the full rate and once with decimate=True. Reported per case: the
+decimation factor, the relative error of filter_energy, the largest
+absolute difference between the (unit-scaled) feature vectors, the
+cosine similarity the detector would see between the two vectors, and
+the time per call of both paths. Exits non-zero if an energy is off by
+more than --energy-tolerance or a similarity drops below
+--min-similarity.
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from model_store import load_models
+from pipeline import SoundHunterPipeline
+from train_system import generate_sound
+
+SAMPLE_RATE = 22050
+SOUNDS = ("bird", "motorcycle", "whistle", "noise")
+FIXED_BANDS = {"50-500": (50.0, 500.0), "100-1000": (100.0, 1000.0), "1000-2000": (1000.0, 2000.0)}
+
+def cosine(a, b):
+    denominator = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(np.dot(a, b) / denominator) if denominator > 0 else 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the decimated and full-rate pipeline paths")
+    parser.add_argument("--seconds", type=float, default=5.0, help="clip length")
+    parser.add_argument("--energy-tolerance", type=float, default=0.01)
+    parser.add_argument("--min-similarity", type=float, default=0.99)
+    args = parser.parse_args()
+
+    bands = dict(FIXED_BANDS)
+    try:
+        for name, model in load_models().items():
+            bands[name] = (model["filter_params"]["low_freq"], model["filter_params"]["high_freq"])
+    except (OSError, ValueError):
+        print("No trained models found; checking the fixed bands only\n")
+
+    np.random.seed(0)
+    clips = {sound: generate_sound(sound, duration=args.seconds, sample_rate=SAMPLE_RATE).astype(np.float32)
+             for sound in SOUNDS}
+
+    print("%-12s %-10s %6s %10s %10s %9s %9s %9s" % (
+        "Band", "Sound", "factor", "energy err", "max dfeat", "cosine", "full ms", "dec ms"))
+    print("-" * 82)
+    failures = 0
+    with SoundHunterPipeline("inprocess") as pipeline:
+        for band_name, (low, high) in bands.items():
+            filter_params = {"low_freq": low, "high_freq": high}
+            for sound, audio in clips.items():
+                def full():
+                    return pipeline.run(audio, SAMPLE_RATE, filter_params, np.ones(10))
+                def decimated():
+                    return pipeline.run(audio, SAMPLE_RATE, filter_params, np.ones(10), decimate=True)
+                reference, result = full(), decimated()
+
+                factor = SAMPLE_RATE // result["filter"]["sample_rate"]
+                full_energy = reference["filter"]["filter_energy"]
+                energy_error = abs(result["filter"]["filter_energy"] - full_energy) / max(full_energy, 1e-12)
+                a = np.asarray(reference["features"]["feature_vector"], dtype=np.float64)
+                b = np.asarray(result["features"]["feature_vector"], dtype=np.float64)
+                similarity = cosine(a, b)
+                full_time = min(timeit.repeat(full, number=3, repeat=3)) / 3
+                decimated_time = min(timeit.repeat(decimated, number=3, repeat=3)) / 3
+
+                # Energies far below the band's loudest clip are dominated by leakage; only flag audible ones
+                audible = full_energy > 1e-3 * max(
+                    pipeline.filter(clip, SAMPLE_RATE, filter_params, return_filtered_audio=False)["filter_energy"]
+                    for clip in clips.values())
+                failed = audible and (energy_error > args.energy_tolerance or similarity < args.min_similarity)
+                failures += failed
+                print("%-12s %-10s %6d %9.2e%s %10.2e %9.5f %9.2f %9.2f%s" % (
+                    band_name, sound, factor, energy_error, "" if audible else "*",
+                    np.max(np.abs(a - b)), similarity, full_time * 1000, decimated_time * 1000,
+                    "  FAIL" if failed else ""))
+
+    print("\n* band energy under 0.1% of the band's loudest clip; not checked")
+    if failures:
+        print("%d case(s) outside tolerance" % failures)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
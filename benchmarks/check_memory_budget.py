@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Peak Python heap per clip of audio-filter and feature-extractor, checked against a budget
+
+Each stage is run once to warm its caches and work buffers, then once
+under tracemalloc. The budget is a multiple of the clip's float32 size
+plus a fixed allowance for per-block work arrays; the script exits
+non-zero if any stage goes over it.
+"""
+
+import sys
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from pipeline import load_component
+
+SAMPLE_RATE = 22050
+MB = 1024 * 1024
+
+# stage -> (multiple of clip bytes, fixed bytes)
+BUDGETS = {
+    "audio_filter": (6.0, 1 * MB),
+    "feature_extractor": (2.5, 6 * MB)
+}
+
+def traced_peak(fn):
+    """Peak bytes allocated while running fn(), after one warm-up call"""
+    fn()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    audio_filter = load_component("audio_filter")
+    feature_extractor = load_component("feature_extractor")
+    rng = np.random.default_rng(0)
+
+    print("=== Peak Memory per Clip ===\n")
+    print("%-7s %-18s %10s %10s %8s" % ("Clip", "Stage", "Peak MB", "Budget MB", "x clip"))
+    print("-" * 57)
+    over = []
+    for duration in (1, 10, 60):
+        audio = rng.standard_normal(SAMPLE_RATE * duration).astype(np.float32)
+        filter_inputs = audio_filter.InputSchema.model_validate({
+            "audio_data": audio,
+            "sample_rate": SAMPLE_RATE,
+            "filter_params": {"low_freq": 100.0, "high_freq": 4000.0}
+        })
+        filtered = audio_filter.apply(filter_inputs)["filtered_audio"]
+        feature_inputs = feature_extractor.InputSchema.model_validate({
+            "filtered_audio": filtered,
+            "sample_rate": SAMPLE_RATE
+        })
+
+        stages = {
+            "audio_filter": lambda: audio_filter.apply(filter_inputs),
+            "feature_extractor": lambda: feature_extractor.apply(feature_inputs)
+        }
+        for stage, fn in stages.items():
+            peak = traced_peak(fn)
+            scale, fixed = BUDGETS[stage]
+            budget = scale * audio.nbytes + fixed
+            print("%-7s %-18s %10.2f %10.2f %8.1f%s" % (
+                "%ds" % duration, stage, peak / MB, budget / MB, peak / audio.nbytes,
+                "  OVER" if peak > budget else ""))
+            if peak > budget:
+                over.append((duration, stage))
+
+    if over:
+        print("\nOver budget: %s" % ", ".join("%ds %s" % item for item in over))
+        sys.exit(1)
+    print("\nAll stages within budget")
+
+if __name__ == "__main__":
+    main()
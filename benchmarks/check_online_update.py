@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Incremental model updates against full retraining
+
+    python benchmarks/check_online_update.py [--clips 20] [--batches 4]
+
+All work happens in a scratch model store, so models/ and trained_models.json
+are left alone. The corpus is split into --batches parts per class. The
+first part is trained with train_detector and its statistics are recorded;
+the rest is fed to update_model one part at a time. Checked per detector:
+
+- the class mean spectra match the mean over every clip seen (--stats-tolerance)
+- the updated band keeps at least --ratio-tolerance of the energy ratio, on
+  the whole corpus, of train_detector on the whole corpus at once. The two
+  fits start from different bands and may settle on different optima.
+- the pattern is the mean of each part's target features at the band in
+  force when the part arrived (--pattern-tolerance)
+
+The time of each update is reported too; it should not grow with the clips
+seen so far. A last run with forgetting < 1 on frequency-shifted clips shows
+the pattern following the shift.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from corpus import SOUND_CLASSES, generate_batch
+from online_update import (DetectorStats, binned_power, pattern_vectors, record_training_stats, stats_path,
+                           update_model)
+from pipeline import SoundHunterPipeline
+from trainer import BandTrainer
+from train_system import save_models, train_detector
+
+TARGETS = ("bird", "motorcycle", "whistle")
+
+def corpus(clips, start=0, freq_jitter=0.05):
+    audio = np.concatenate([generate_batch(sound, clips, start=start, freq_jitter=freq_jitter)
+                            for sound in SOUND_CLASSES])
+    labels = [sound for sound in SOUND_CLASSES for _ in range(clips)]
+    return audio, labels
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def drifted(clips, start):
+    """Clips of every class with the whistle 10% higher"""
+    audio, labels = corpus(clips, start=start)
+    whistle = np.array([label == "whistle" for label in labels])
+    t = np.linspace(0, 1, audio.shape[1])
+    audio[whistle] = np.sin(2 * np.pi * 1650 * t).astype(np.float32)
+    return audio, labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare online_update.update_model with full retraining")
+    parser.add_argument("--clips", type=int, default=20, help="clips per class")
+    parser.add_argument("--batches", type=int, default=4)
+    parser.add_argument("--stats-tolerance", type=float, default=1e-9)
+    parser.add_argument("--ratio-tolerance", type=float, default=0.95)
+    parser.add_argument("--pattern-tolerance", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    per_batch = args.clips // args.batches
+    batches = [corpus(per_batch, start=i * per_batch) for i in range(args.batches)]
+    all_audio = np.concatenate([audio for audio, _ in batches])
+    all_labels = [label for _, labels in batches for label in labels]
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as scratch:
+        store_path = str(Path(scratch) / "models")
+        json_path = str(Path(scratch) / "trained_models.json")
+
+        audio, labels = batches[0]
+        models = {target: quiet(train_detector, audio, labels, target) for target in TARGETS}
+        save_models(models, json_path, store_path)
+        record_training_stats(models, audio, labels, store_path)
+
+        update_times = {target: [] for target in TARGETS}
+        # Band each part's target features were taken at
+        part_bands = {target: [models[target]["filter_params"]] for target in TARGETS}
+        for audio, labels in batches[1:]:
+            for target in TARGETS:
+                start = time.perf_counter()
+                models[target] = update_model(target, audio, labels, store_path=store_path, json_path=json_path)
+                update_times[target].append(time.perf_counter() - start)
+                part_bands[target].append(models[target]["filter_params"])
+
+        power = binned_power(all_audio)
+        is_label = {label: np.array([l == label for l in all_labels]) for label in SOUND_CLASSES}
+        trainer = BandTrainer()
+        print("%-11s %9s %-17s %9s %-17s %9s %9s  %s" % (
+            "Detector", "stats err", "updated band", "ratio", "retrained band", "ratio", "pattern", "update ms"))
+        print("-" * 104)
+        with SoundHunterPipeline("inprocess") as pipeline:
+            for target in TARGETS:
+                stats = DetectorStats.load(stats_path(target, store_path))
+                stats_error = max(np.max(np.abs(stats.classes[label][1] - power[is_label[label]].mean(axis=0)))
+                                  / np.max(power[is_label[label]].mean(axis=0)) for label in SOUND_CLASSES)
+
+                reference = quiet(train_detector, all_audio, all_labels, target)
+                bands = [(model["filter_params"]["low_freq"], model["filter_params"]["high_freq"])
+                         for model in (models[target], reference)]
+                ratios = [trainer.energy_ratio(power, stats.freqs, is_label[target], band) for band in bands]
+
+                expected = np.concatenate([
+                    pattern_vectors(pipeline, audio[np.array([l == target for l in labels])], band)
+                    for (audio, labels), band in zip(batches, part_bands[target])]).mean(axis=0)
+                pattern_error = np.max(np.abs(np.asarray(models[target]["target_pattern"]) - expected))
+
+                failed = (stats_error > args.stats_tolerance or ratios[0] < args.ratio_tolerance * ratios[1]
+                          or pattern_error > args.pattern_tolerance)
+                failures += failed
+                print("%-11s %9.2e %7.1f-%-7.1f Hz %9.1f %7.1f-%-7.1f Hz %9.1f %9.2e  %s%s" % (
+                    target, stats_error, bands[0][0], bands[0][1], ratios[0], bands[1][0], bands[1][1], ratios[1],
+                    pattern_error, " ".join("%.1f" % (t * 1000) for t in update_times[target]),
+                    "  FAIL" if failed else ""))
+
+        # Drift: the whistle moves 10% up; forgetting lets the pattern follow within a few updates
+        print("\nWhistle drifting 10%% up, %d clips per class per update:" % per_batch)
+        shifted = []
+        for forgetting in (1.0, 0.8):
+            # Start every run from the same trained statistics
+            models = {target: quiet(train_detector, all_audio, all_labels, target) for target in TARGETS}
+            save_models(models, json_path, store_path)
+            record_training_stats(models, all_audio, all_labels, store_path)
+            reference = np.asarray(quiet(train_detector, *drifted(per_batch * args.batches, 0), "whistle")["target_pattern"])
+            for i in range(args.batches):
+                model = update_model("whistle", *drifted(per_batch, 5000 + i * per_batch), forgetting=forgetting,
+                                     store_path=store_path, json_path=json_path)
+            distance = np.linalg.norm(np.asarray(model["target_pattern"]) - reference)
+            shifted.append(distance)
+            print("  forgetting %.2f: pattern distance to the drifted-only pattern %.4g" % (forgetting, distance))
+
+    if shifted[1] >= shifted[0]:
+        print("forgetting did not move the pattern toward the drifted clips")
+        failures += 1
+    if failures:
+        print("%d check(s) failed" % failures)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
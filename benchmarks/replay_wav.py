@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Replay WAV files through the detection service faster than real time
+
+    python benchmarks/replay_wav.py [--speed 20] [--chunk 1024] [file.wav ...]
+
+With no files, a WAV of concatenated generate_sound clips is written to a
+temporary directory and replayed. Prints the detection events, then the
+end-to-end latency percentiles (chunk arrival to scored window) and the
+per-stage percentiles.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from detection_service import STAGES, DetectionService, pcm_to_float, print_event
+from detection_gate import DetectionGate, FLOOR_MODES
+from model_store import load_models
+from train_system import generate_sound
+
+def read_wav(path):
+    """(float32 mono samples, sample rate) of a 16-bit PCM WAV file"""
+    with wave.open(str(path), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError("%s: only 16-bit PCM is supported" % path)
+        channels = f.getnchannels()
+        sample_rate = f.getframerate()
+        samples = pcm_to_float(f.readframes(f.getnframes()))
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, sample_rate
+
+def write_synthetic_wav(path, sample_rate=22050, seconds_per_sound=2):
+    """Write bird, silence, motorcycle, silence, whistle, noise as a 16-bit WAV"""
+    silence = np.zeros(sample_rate * seconds_per_sound)
+    parts = []
+    for sound in ("bird", None, "motorcycle", None, "whistle", "noise"):
+        if sound is None:
+            parts.append(silence)
+        else:
+            parts.extend(generate_sound(sound, sample_rate=sample_rate) for _ in range(seconds_per_sound))
+    audio = 0.5 * np.concatenate(parts)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+async def replay(service, samples, sample_rate, chunk, speed):
+    """Feed samples in chunks, paced at `speed` times real time (0: as fast as possible)"""
+    consumer = asyncio.create_task(service.run())
+    start = time.perf_counter()
+    for offset in range(0, len(samples), chunk):
+        await service.feed(samples[offset:offset + chunk])
+        if speed > 0:
+            due = start + (offset + chunk) / (sample_rate * speed)
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+    await service.end_of_stream()
+    await consumer
+    return time.perf_counter() - start
+
+def format_percentiles(percentiles):
+    return "  ".join("p%d %7.2f ms" % (p, value * 1000) for p, value in percentiles.items())
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAV files through DetectionService")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--speed", type=float, default=20.0, help="times real time; 0 = unpaced")
+    parser.add_argument("--chunk", type=int, default=1024, help="samples per fed chunk")
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--hop", type=float, default=0.25)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--gate", choices=FLOOR_MODES, help="pre-gate windows on band energy")
+    parser.add_argument("--quiet", action="store_true", help="do not print individual events")
+    args = parser.parse_args()
+
+    models = load_models()
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.files
+        if not files:
+            files = [Path(tmp) / "synthetic.wav"]
+            write_synthetic_wav(files[0])
+
+        for path in files:
+            samples, sample_rate = read_wav(path)
+            print("=== %s: %.1f s at %d Hz, replayed at %s ===" % (
+                Path(path).name, len(samples) / sample_rate, sample_rate,
+                "%gx" % args.speed if args.speed > 0 else "full speed"))
+
+            # Pacing is simulated, so the budget scales with the replay speed
+            speed = args.speed if args.speed > 0 else 1.0
+            budget = {stage: args.hop / len(STAGES) / speed for stage in STAGES}
+            service = DetectionService(models, sample_rate, args.window, args.hop, args.threshold,
+                                       latency_budget=budget,
+                                       on_event=None if args.quiet else print_event,
+                                       gate=DetectionGate(models, mode=args.gate) if args.gate else None)
+            try:
+                wall = asyncio.run(replay(service, samples, sample_rate, args.chunk, args.speed))
+            finally:
+                service.close()
+
+            report = service.report()
+            print("\nAudio %.1f s in %.2f s wall (%.1fx real time)" % (
+                len(samples) / sample_rate, wall, len(samples) / sample_rate / wall))
+            print("Windows processed %d, gated %d, skipped %d, events %d, budget overruns %s" % (
+                report["windows_processed"], report["windows_gated"], report["windows_skipped"],
+                report["events"],
+                ", ".join("%s %d" % item for item in report["budget_overruns"].items())))
+            print("End-to-end latency: %s" % format_percentiles(report["latency"]))
+            for stage, percentiles in report["stage_latency"].items():
+                if percentiles:
+                    print("  %-9s %s" % (stage, format_percentiles(percentiles)))
+            print()
+
+if __name__ == "__main__":
+    main()
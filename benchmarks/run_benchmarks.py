@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Reproducible benchmark suite for the components, the pipeline, corpus generation and training
+
+    python benchmarks/run_benchmarks.py [--quick] [--output results.json]
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+
+Everything runs in-process (no Docker, no network) on signals from
+train_system.generate_sound with fixed seeds. Every case is timed with
+timeit: the loop count is calibrated to at least 0.2 s, then the best,
+median and mean of several repeats are recorded per call. Results go to
+benchmarks/results/<commit>.json by default. --compare prints per-case
+ratios and exits non-zero if any case slowed down by more than
+--tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+from corpus import generate_batch
+from pipeline import SoundHunterPipeline, load_component
+from train_system import generate_sound, train_detector
+
+SAMPLE_RATE = 22050
+SOUNDS = ("bird", "motorcycle", "whistle", "noise")
+BANDS = {"bird": (2000.0, 5000.0), "motorcycle": (80.0, 400.0), "whistle": (1000.0, 2000.0)}
+
+FULL_SWEEP = {
+    "clip_seconds": (0.5, 1, 5, 30),
+    "batch_sizes": (1, 8, 32),
+    "pattern_counts": (1, 10, 100, 1000),
+    "train_max_iter": 300
+}
+QUICK_SWEEP = {
+    "clip_seconds": (1, 5),
+    "batch_sizes": (1, 8),
+    "pattern_counts": (10, 100),
+    "train_max_iter": 50
+}
+
+def clip(sound, seconds):
+    """Deterministic float32 clip of generate_sound output"""
+    np.random.seed(0)
+    return generate_sound(sound, duration=seconds, sample_rate=SAMPLE_RATE).astype(np.float32)
+
+def measure(fn, repeat=5):
+    """Per-call timing statistics of fn() in seconds"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, number)
+    times = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "loops": number,
+        "repeat": repeat
+    }
+
+def component_cases(sweep):
+    audio_filter = load_component("audio_filter")
+    feature_extractor = load_component("feature_extractor")
+    pattern_detector = load_component("pattern_detector")
+    rng = np.random.default_rng(0)
+
+    for seconds in sweep["clip_seconds"]:
+        audio = clip("bird", seconds)
+        filter_inputs = audio_filter.InputSchema.model_validate({
+            "audio_data": audio,
+            "sample_rate": SAMPLE_RATE,
+            "filter_params": {"low_freq": 2000.0, "high_freq": 5000.0}
+        })
+        filtered = audio_filter.apply(filter_inputs)["filtered_audio"]
+        feature_inputs = feature_extractor.InputSchema.model_validate({
+            "filtered_audio": filtered,
+            "sample_rate": SAMPLE_RATE
+        })
+        params = {"clip_seconds": seconds}
+        yield "audio_filter.apply", params, lambda: audio_filter.apply(filter_inputs)
+        yield "feature_extractor.apply", params, lambda: feature_extractor.apply(feature_inputs)
+
+    vector = rng.standard_normal(10).astype(np.float32)
+    detect_inputs = pattern_detector.InputSchema.model_validate({
+        "feature_vector": vector,
+        "target_pattern": vector + 0.1,
+        "detection_threshold": 0.8
+    })
+    yield "pattern_detector.apply", {}, lambda: pattern_detector.apply(detect_inputs)
+
+    for batch_size in sweep["batch_sizes"]:
+        batch = np.stack([clip(SOUNDS[i % len(SOUNDS)], 1) for i in range(batch_size)])
+        batch_inputs = audio_filter.BatchInputSchema.model_validate({
+            "audio_batch": batch,
+            "sample_rate": SAMPLE_RATE,
+            "bands": np.array(list(BANDS.values()))
+        })
+        yield ("audio_filter.apply_batch", {"batch_size": batch_size, "bands": len(BANDS)},
+               lambda: audio_filter.apply_batch(batch_inputs))
+
+        for pattern_count in sweep["pattern_counts"]:
+            bank_inputs = pattern_detector.BankInputSchema.model_validate({
+                "feature_vectors": rng.standard_normal((batch_size, 10)).astype(np.float32),
+                "target_patterns": rng.standard_normal((pattern_count, 10)).astype(np.float32),
+                "detection_threshold": 0.8
+            })
+            yield ("pattern_detector.apply_bank", {"batch_size": batch_size, "patterns": pattern_count},
+                   lambda: pattern_detector.apply_bank(bank_inputs))
+
+def pipeline_cases(sweep, pipeline):
+    models = {sound: {"filter_params": {"low_freq": low, "high_freq": high},
+                      "target_pattern": np.ones(10, dtype=np.float32)}
+              for sound, (low, high) in BANDS.items()}
+    for seconds in sweep["clip_seconds"]:
+        audio = clip("whistle", seconds)
+        params = {"clip_seconds": seconds}
+        yield ("pipeline.run", params,
+               lambda: pipeline.run(audio, SAMPLE_RATE, models["whistle"]["filter_params"],
+                                    models["whistle"]["target_pattern"]))
+        yield ("pipeline.detect_all", dict(params, models=len(models)),
+               lambda: pipeline.detect_all(audio, SAMPLE_RATE, models))
+
+def corpus_cases(sweep):
+    for batch_size in sweep["batch_sizes"]:
+        for sound in ("bird", "noise"):
+            yield ("corpus.generate_batch", {"batch_size": batch_size, "sound": sound},
+                   lambda: generate_batch(sound, batch_size, freq_jitter=0.05, duration_jitter=0.2,
+                                          snr_db=(10, 30)))
+
+def training_case(sweep):
+    np.random.seed(0)
+    audio = [generate_sound(sound) for sound in SOUNDS for _ in range(5)]
+    labels = [sound for sound in SOUNDS for _ in range(5)]
+
+    def train():
+        # train_detector reports progress on stdout; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            train_detector(audio, labels, "whistle", max_iter=sweep["train_max_iter"])
+
+    return "train_detector", {"clips": len(audio), "max_iter": sweep["train_max_iter"]}, train
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def case_key(name, params):
+    return name + "".join("[%s=%s]" % item for item in sorted(params.items()))
+
+def run_suite(quick):
+    sweep = QUICK_SWEEP if quick else FULL_SWEEP
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "sweep": "quick" if quick else "full"
+        },
+        "cases": {}
+    }
+
+    def record(name, params, fn, repeat=5):
+        stats = measure(fn, repeat)
+        results["cases"][case_key(name, params)] = dict(stats, name=name, params=params)
+        print("%-62s %10.3f ms  (median %.3f ms, %d loops)" % (
+            case_key(name, params), stats["min"] * 1000, stats["median"] * 1000, stats["loops"]))
+
+    for name, params, fn in component_cases(sweep):
+        record(name, params, fn)
+    with SoundHunterPipeline("inprocess") as pipeline:
+        for name, params, fn in pipeline_cases(sweep, pipeline):
+            record(name, params, fn)
+    for name, params, fn in corpus_cases(sweep):
+        record(name, params, fn)
+    name, params, fn = training_case(sweep)
+    record(name, params, fn, repeat=3)
+    return results
+
+def compare(old_path, new_path, tolerance):
+    """Print per-case ratios new/old of the best time; returns the regressed case keys"""
+    with open(old_path, "r") as f:
+        old = json.load(f)
+    with open(new_path, "r") as f:
+        new = json.load(f)
+    print("%s (%s) -> %s (%s)\n" % (old_path, old["meta"]["commit"], new_path, new["meta"]["commit"]))
+    regressions = []
+    for key in sorted(set(old["cases"]) | set(new["cases"])):
+        if key not in old["cases"] or key not in new["cases"]:
+            print("%-62s %s" % (key, "only in new" if key in new["cases"] else "only in old"))
+            continue
+        ratio = new["cases"][key]["min"] / old["cases"][key]["min"]
+        flag = ""
+        if ratio > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 / tolerance:
+            flag = "  faster"
+        print("%-62s %6.2fx%s" % (key, ratio, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Sound Hunter benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="smaller sweep for a fast check")
+    parser.add_argument("--output", help="JSON results path (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two results files")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="slowdown ratio reported as a regression by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(args.compare[0], args.compare[1], args.tolerance)
+        if regressions:
+            print("\n%d case(s) slower than %.2fx" % (len(regressions), args.tolerance))
+            sys.exit(1)
+        return
+
+    results = run_suite(args.quick)
+    output = Path(args.output) if args.output else (
+        Path(__file__).resolve().parent / "results" / ("%s.json" % (results["meta"]["commit"] or "unversioned")))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("\nResults written to %s" % output)
+
+if __name__ == "__main__":
+    main()
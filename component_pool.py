@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Warm component containers shared by every script on this machine.
+
+ComponentPool starts each component image once with tesseract_core.serve.
+It records the container name and URL in a small state file
+(.component_pool.json, or $SOUND_HUNTER_POOL_STATE). Later pools, in the
+same process or in another script, read the state file and connect with
+Tesseract.from_url after a health check, instead of starting a new
+container. A container that fails its health check, or whose connection
+drops during a call, is removed and started again. A file lock
+serializes these checks, so scripts started together do not race to
+start the same image.
+
+The containers keep running after the scripts exit:
+
+    python component_pool.py start     # start (or health-check) every component
+    python component_pool.py status
+    python component_pool.py stop      # remove the pool's containers
+"""
+
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import time
+
+import array_transport
+from model_store import write_json_atomic
+from pipeline import COMPONENT_IMAGES
+
+POOL_STATE = os.environ.get("SOUND_HUNTER_POOL_STATE", ".component_pool.json")
+
+# Seconds allowed for a health probe of a running container and for a new one to come up
+HEALTH_TIMEOUT = 5.0
+STARTUP_TIMEOUT = 60.0
+
+def is_healthy(url, timeout=HEALTH_TIMEOUT):
+    """True if a Tesseract answers its health endpoint at url"""
+    import tesseract_core
+
+    try:
+        tesseract_core.Tesseract.from_url(url, timeout=timeout).health()
+    except Exception:
+        return False
+    return True
+
+def _remove_container(container):
+    import tesseract_core
+
+    try:
+        tesseract_core.teardown(container)
+    except Exception:
+        # Already gone (docker restart, manual cleanup); nothing to remove
+        pass
+
+class ComponentPool:
+    """Connect to long-lived component containers, starting or replacing them as needed"""
+
+    def __init__(self, images=None, state_path=POOL_STATE, startup_timeout=STARTUP_TIMEOUT):
+        self.images = dict(images or COMPONENT_IMAGES)
+        self.state_path = state_path
+        self.startup_timeout = startup_timeout
+        self.tesseracts = {}
+        self.urls = {}
+        self.stats = {"reused": 0, "started": 0, "restarted": 0}
+
+    @contextlib.contextmanager
+    def _state(self):
+        """Hold the pool lock and yield the state dict; it is written back on exit"""
+        with open(self.state_path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = {}
+                if os.path.exists(self.state_path):
+                    with open(self.state_path, "r") as f:
+                        state = json.load(f)
+                yield state
+                write_json_atomic(self.state_path, state, indent=2)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _connect(self, name, stale_url=None):
+        """Tesseract client for a healthy container of component name"""
+        import tesseract_core
+
+        image = self.images[name]
+        with self._state() as state:
+            entry = state.get(name)
+            if entry is not None and entry["image"] == image and entry["url"] != stale_url \
+                    and is_healthy(entry["url"]):
+                self.stats["reused"] += 1
+            else:
+                if entry is not None:
+                    _remove_container(entry["container"])
+                    self.stats["restarted"] += 1
+                else:
+                    self.stats["started"] += 1
+                container_name, container = tesseract_core.serve(image, startup_timeout=self.startup_timeout)
+                entry = state[name] = {
+                    "image": image,
+                    "container": container_name,
+                    "url": container.url,
+                    "started": time.time()
+                }
+        self.urls[name] = entry["url"]
+        return tesseract_core.Tesseract.from_url(entry["url"])
+
+    def get(self, name):
+        """Client for component name, connecting (and starting its container) on first use"""
+        tesseract = self.tesseracts.get(name)
+        if tesseract is None:
+            tesseract = self.tesseracts[name] = self._connect(name)
+        return tesseract
+
+    def start(self):
+        """Connect to every component now; returns self"""
+        for name in self.images:
+            self.get(name)
+        return self
+
+    def apply(self, name, inputs):
+        """array_transport.apply on component name, replacing its container once if it has died"""
+        import requests
+
+        tesseract = self.get(name)
+        try:
+            return array_transport.apply(tesseract, inputs)
+        except requests.ConnectionError:
+            # The container went away between calls: start a fresh one and retry once
+            tesseract = self.tesseracts[name] = self._connect(name, stale_url=self.urls[name])
+            return array_transport.apply(tesseract, inputs)
+
+    def status(self):
+        """{name: state entry plus "healthy"} for every container the state file knows"""
+        with self._state() as state:
+            return {name: dict(entry, healthy=is_healthy(entry["url"])) for name, entry in state.items()}
+
+    def stop(self):
+        """Remove every container of the pool and forget it"""
+        with self._state() as state:
+            for entry in state.values():
+                _remove_container(entry["container"])
+            state.clear()
+        self.tesseracts.clear()
+        self.urls.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the warm Sound Hunter component containers")
+    parser.add_argument("command", choices=("start", "status", "stop"))
+    args = parser.parse_args()
+
+    pool = ComponentPool()
+    if args.command == "start":
+        start = time.perf_counter()
+        pool.start()
+        print("Component pool ready in %.1f s (%d started, %d reused, %d restarted)" % (
+            time.perf_counter() - start, pool.stats["started"], pool.stats["reused"], pool.stats["restarted"]))
+    elif args.command == "stop":
+        pool.stop()
+        print("Component pool stopped")
+    if args.command != "stop":
+        for name, entry in sorted(pool.status().items()):
+            print("%-18s %-26s %-24s %s" % (name, entry["image"], entry["url"],
+                                            "healthy" if entry["healthy"] else "UNHEALTHY"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Code shared by the scripts and the component images.
+
+Every component's tesseract_config.yaml copies this file into its image
+next to tesseract_api.py (build_config.package_data), and in-process the
+components import it from the repository root, so there is one copy of
+the metrics core and of the scratch buffers to keep up to date. metrics.py adds the registries and
+the exporters on top of it.
+"""
+
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# In-memory metrics: per-call latency histograms, counters and gauges.
+# Disabled unless SOUND_HUNTER_METRICS=1; a disabled timer is a shared
+# no-op context manager, so instrumented code costs one attribute check.
+METRICS_ENABLED = os.environ.get("SOUND_HUNTER_METRICS", "0") == "1"
+
+LATENCY_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, float("inf"))
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds values <= buckets[i] and > buckets[i - 1]"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+class Metrics:
+    """Counters, gauges and histograms of one component"""
+
+    def __init__(self, component, enabled=None):
+        self.component = component
+        self.enabled = METRICS_ENABLED if enabled is None else enabled
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def timer(self, name):
+        """Context manager adding its wall time to the `name` latency histogram"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator recording each call's wall time under `name`"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Timer(self, name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def observe_size(self, name, nbytes):
+        self.observe(name, nbytes, SIZE_BUCKETS)
+
+    def increment(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, fn):
+        """Register fn() to be evaluated for gauge `name` at snapshot time"""
+        self.gauges[name] = fn
+
+    def snapshot(self):
+        return {
+            "component": self.component,
+            "counters": dict(self.counters),
+            "gauges": {name: float(fn()) for name, fn in self.gauges.items()},
+            "histograms": {
+                name: {"buckets": list(h.buckets), "counts": list(h.counts), "sum": h.sum, "count": h.count}
+                for name, h in self.histograms.items()
+            }
+        }
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+# Per-thread scratch arrays for intermediates that never leave a call,
+# keyed on (name, shape, dtype); arrays above WORK_BUFFER_MAX_BYTES are not kept.
+# In-process the components share a thread's pool, so it holds both components' entries
+WORK_BUFFER_LIMIT = 16
+WORK_BUFFER_MAX_BYTES = 16 * 1024 * 1024
+
+_work_buffers = threading.local()
+
+def work_buffer(name, shape, dtype):
+    """Uninitialized scratch array that later calls in this thread will overwrite"""
+    dtype = np.dtype(dtype)
+    if int(np.prod(shape)) * dtype.itemsize > WORK_BUFFER_MAX_BYTES:
+        return np.empty(shape, dtype)
+    buffers = getattr(_work_buffers, "buffers", None)
+    if buffers is None:
+        buffers = _work_buffers.buffers = OrderedDict()
+    key = (name, tuple(shape), dtype.str)
+    buffer = buffers.get(key)
+    if buffer is None:
+        buffer = buffers[key] = np.empty(shape, dtype)
+        if len(buffers) > WORK_BUFFER_LIMIT:
+            buffers.popitem(last=False)
+    else:
+        buffers.move_to_end(key)
+    return buffer
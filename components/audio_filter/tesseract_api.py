@@ -1,8 +1,10 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Literal, Optional
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import os
 import numpy as np
-import json
-import traceback
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing_extensions import Self
 
 # Handle imports for build time
@@ -18,6 +20,14 @@ except ImportError:
     def Array(shape, dtype):
         return list
 
+# Copied into the image next to this file (tesseract_config.yaml package_data)
+from component_support import Metrics, work_buffer
+
+metrics = Metrics("audio-filter")
+
+# FIR length shared by the fir engine and the streaming filter
+DEFAULT_NUM_TAPS = 1025
+
 class FilterParameters(BaseModel):
     low_freq: Differentiable[Float32] = Field(
         description="Lower frequency cutoff in Hz",
@@ -48,6 +58,74 @@ class InputSchema(BaseModel):
     filter_params: FilterParameters = Field(
         description="Bandpass filter parameters"
     )
+    spectral_index: bool = Field(
+        description="Answer filter_energy from the cached cumulative power spectrum "
+                    "of this clip instead of filtering it; filtered_audio is returned empty",
+        default=False
+    )
+    edge_width: Float32 = Field(
+        description="Width in Hz of the sigmoid band edges; 0 keeps the brick-wall mask",
+        default=0.0,
+        ge=0.0
+    )
+    return_filtered_audio: bool = Field(
+        description="Convert the filtered spectrum back to the time domain; when false "
+                    "the inverse FFT is skipped and filtered_audio is returned empty",
+        default=True
+    )
+    return_spectrum: bool = Field(
+        description="Also return the masked magnitude spectrum for feature-extractor",
+        default=False
+    )
+    engine: Literal["fft", "fir", "butter", "cheby1"] = Field(
+        description="Filter engine: FFT mask, windowed-sinc FIR, or Butterworth / "
+                    "Chebyshev type I second-order sections",
+        default="fft"
+    )
+    num_taps: int = Field(
+        description="FIR length for the fir engine",
+        default=DEFAULT_NUM_TAPS,
+        ge=3
+    )
+    filter_order: int = Field(
+        description="Prototype order for the butter and cheby1 engines",
+        default=4,
+        ge=1,
+        le=12
+    )
+    ripple_db: Float32 = Field(
+        description="Passband ripple in dB for the cheby1 engine",
+        default=1.0,
+        gt=0.0
+    )
+    decimate: bool = Field(
+        description="Downsample to the lowest integer fraction of sample_rate that still "
+                    "covers high_freq before filtering; filtered_audio and sample_rate are "
+                    "returned at that rate, filter_energy on the original rate's scale",
+        default=False
+    )
+    bands: Optional[Array[(None, 2), Float32]] = Field(
+        description="Also filter the clip through each (low_freq, high_freq) row (M, 2), reusing "
+                    "its FFT: band_energy and, with return_filtered_audio or return_spectrum, "
+                    "band_filtered_audio or band_magnitude_spectrum are returned, while filtered_audio comes back empty and filter_energy is taken "
+                    "from Parseval. Only with the fft engine, without spectral_index or decimate",
+        default=None
+    )
+
+    @model_validator(mode='after')
+    def validate_engine(self) -> Self:
+        if self.engine != "fft":
+            if self.spectral_index:
+                raise ValueError("spectral_index is only available with the fft engine")
+            if self.filter_params.high_freq >= self.sample_rate / 2:
+                raise ValueError("high_freq must be below the Nyquist frequency for the %s engine" % self.engine)
+        if self.bands is not None:
+            if self.engine != "fft" or self.spectral_index or self.decimate:
+                raise ValueError("bands needs the fft engine, without spectral_index or decimate")
+            bands = np.asarray(self.bands)
+            if len(bands) and np.any(bands[:, 1] <= bands[:, 0]):
+                raise ValueError('high_freq must be greater than low_freq in every band')
+        return self
 
 class OutputSchema(BaseModel):
     filtered_audio: Differentiable[Array[(None,), Float32]] = Field(
@@ -62,99 +140,675 @@ class OutputSchema(BaseModel):
     sample_rate: int = Field(
         description="Sample rate"
     )
+    magnitude_spectrum: Optional[Array[(None,), Float32]] = Field(
+        description="Magnitude of the masked rfft, if requested",
+        default=None
+    )
+    band_energy: Optional[Array[(None,), Float32]] = Field(
+        description="Energy of the clip after each of the requested bands (M,)",
+        default=None
+    )
+    band_filtered_audio: Optional[Array[(None, None), Float32]] = Field(
+        description="The clip filtered through each of the requested bands (M, T), "
+                    "if return_filtered_audio",
+        default=None
+    )
+    band_magnitude_spectrum: Optional[Array[(None, None), Float32]] = Field(
+        description="Masked magnitude spectrum of the clip for each requested band (M, F), "
+                    "if return_spectrum",
+        default=None
+    )
 
-def log_debug(msg):
-    """Log to both console and file for debugging"""
-    print(f"[JACOBIAN DEBUG] {msg}")
-    try:
-        with open("/tmp/jacobian_debug.log", "a") as f:
-            f.write(f"{msg}\n")
-    except:
-        pass
+class BatchInputSchema(BaseModel):
+    audio_batch: Array[(None, None), Float32] = Field(
+        description="Audio clips of equal length, one per row (N, T)"
+    )
+    sample_rate: int = Field(
+        description="Sample rate in Hz",
+        ge=8000
+    )
+    bands: Array[(None, 2), Float32] = Field(
+        description="Candidate (low_freq, high_freq) bands in Hz, one per row (M, 2)"
+    )
+    return_filtered_audio: bool = Field(
+        description="Also return every clip filtered through every band (N, M, T)",
+        default=False
+    )
+    edge_width: Float32 = Field(
+        description="Width in Hz of the sigmoid band edges; 0 keeps the brick-wall mask",
+        default=0.0,
+        ge=0.0
+    )
 
+    @field_validator('bands')
+    @classmethod
+    def validate_bands(cls, v):
+        bands = np.asarray(v)
+        if len(bands) and np.any(bands[:, 1] <= bands[:, 0]):
+            raise ValueError('high_freq must be greater than low_freq in every band')
+        return v
+
+class BatchOutputSchema(BaseModel):
+    filter_energy: Array[(None, None), Float32] = Field(
+        description="Energy of each clip after each band (N, M)"
+    )
+    peak_frequency: Array[(None,), Float32] = Field(
+        description="Dominant frequency of each clip (N,)"
+    )
+    filtered_audio: Optional[Array[(None, None, None), Float32]] = Field(
+        description="Filtered audio per clip and band (N, M, T), if requested",
+        default=None
+    )
+    sample_rate: int = Field(
+        description="Sample rate"
+    )
+
+# FFT implementation used for whole-clip and streaming transforms: "numpy",
+# or "scipy" (scipy.fft, multithreaded with FFT_WORKERS). Configured through
+# the environment so it can be set per container, or with set_fft_backend
+FFT_BACKENDS = ("numpy", "scipy")
+FFT_BACKEND = os.environ.get("AUDIO_FILTER_FFT_BACKEND", "numpy")
+FFT_WORKERS = int(os.environ.get("AUDIO_FILTER_FFT_WORKERS", "1"))
+
+def set_fft_backend(backend, workers=None):
+    """Select the FFT implementation ("numpy" or "scipy") and scipy's worker count"""
+    global FFT_BACKEND, FFT_WORKERS
+    if backend not in FFT_BACKENDS:
+        raise ValueError("Unknown FFT backend '%s', expected one of %s" % (backend, FFT_BACKENDS))
+    if backend == "scipy":
+        import scipy.fft  # noqa: F401 -- fail here rather than on the first transform
+    FFT_BACKEND = backend
+    if workers is not None:
+        FFT_WORKERS = int(workers)
+
+@metrics.timed("fft")
+def rfft(x, n=None, axis=-1):
+    """Real forward FFT through the selected backend"""
+    if FFT_BACKEND == "scipy":
+        import scipy.fft
+        return scipy.fft.rfft(x, n, axis=axis, workers=FFT_WORKERS)
+    return np.fft.rfft(x, n, axis=axis)
+
+@metrics.timed("fft")
+def irfft(x, n=None, axis=-1):
+    """Inverse real FFT through the selected backend"""
+    if FFT_BACKEND == "scipy":
+        import scipy.fft
+        return scipy.fft.irfft(x, n, axis=axis, workers=FFT_WORKERS)
+    return np.fft.irfft(x, n, axis=axis)
+
+def sigmoid(x):
+    """Logistic function, written with tanh so it cannot overflow"""
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+def band_mask(freqs, low_freq, high_freq, edge_width=0.0):
+    """Bandpass mask over freqs; sigmoid-edged when edge_width > 0"""
+    if edge_width <= 0:
+        return (freqs >= low_freq) & (freqs <= high_freq)
+    return sigmoid((freqs - low_freq) / edge_width) * sigmoid((high_freq - freqs) / edge_width)
+
+def band_mask_gradients(freqs, low_freq, high_freq, edge_width):
+    """Sigmoid-edged mask and its derivatives with respect to low_freq and high_freq"""
+    rising = sigmoid((freqs - low_freq) / edge_width)
+    falling = sigmoid((high_freq - freqs) / edge_width)
+    mask = rising * falling
+    d_low = -rising * (1.0 - rising) * falling / edge_width
+    d_high = rising * falling * (1.0 - falling) / edge_width
+    return mask, d_low, d_high
+
+# Number of (n, sample_rate) frequency grids and band masks kept; training
+# reuses one clip length and rate with slowly moving cutoffs
+FREQUENCY_GRID_CACHE_SIZE = 16
+BAND_MASK_CACHE_SIZE = 256
+
+@lru_cache(maxsize=FREQUENCY_GRID_CACHE_SIZE)
+def frequency_grid(n, sample_rate):
+    """Shared, read-only rfftfreq grid for n samples at sample_rate"""
+    freqs = np.fft.rfftfreq(n, 1/sample_rate)
+    freqs.flags.writeable = False
+    return freqs
+
+@lru_cache(maxsize=BAND_MASK_CACHE_SIZE)
+def cached_band_mask(n, sample_rate, low_freq, high_freq, edge_width=0.0):
+    """Shared, read-only band_mask over frequency_grid(n, sample_rate)"""
+    mask = band_mask(frequency_grid(n, sample_rate), low_freq, high_freq, edge_width)
+    mask.flags.writeable = False
+    return mask
+
+def cache_info():
+    """Hit/miss counters of the frequency grid and band mask caches"""
+    return {
+        "frequency_grid": frequency_grid.cache_info()._asdict(),
+        "band_mask": cached_band_mask.cache_info()._asdict()
+    }
+
+def _hit_rate(info):
+    lookups = info.hits + info.misses
+    return info.hits / lookups if lookups else 0.0
+
+metrics.gauge("frequency_grid_cache_hit_rate", lambda: _hit_rate(frequency_grid.cache_info()))
+metrics.gauge("band_mask_cache_hit_rate", lambda: _hit_rate(cached_band_mask.cache_info()))
+metrics.gauge("spectral_index_cache_size", lambda: len(_spectral_index_cache))
+
+def cache_clear():
+    frequency_grid.cache_clear()
+    cached_band_mask.cache_clear()
+
+def parseval_energy(fft, n):
+    """Sum of parseval_power(fft, n) without materializing the power array"""
+    energy = 2.0 * np.vdot(fft, fft).real - abs(fft[0]) ** 2
+    if n % 2 == 0:
+        energy -= abs(fft[-1]) ** 2
+    return float(energy) / n
+
+def parseval_power(fft, n):
+    """Per-bin energy contribution of an rfft along its last axis"""
+    # Parseval: energy of irfft(fft * mask) is the weighted sum of |fft|^2
+    # over the band, where every bin except DC and Nyquist counts twice
+    power = np.abs(fft) ** 2
+    power[..., 1:] *= 2
+    if n % 2 == 0:
+        power[..., -1] /= 2
+    power /= n
+    return power
+
+# Optional external store of clip spectra (e.g. a root-level
+# corpus_cache.SpectralCorpusCache) installed in-process with
+# set_spectrum_cache; every whole-clip rfft reads through it
+_spectrum_cache = None
+
+def set_spectrum_cache(cache):
+    """Route whole-clip FFTs through cache.rfft(audio, sample_rate); None disables"""
+    global _spectrum_cache
+    _spectrum_cache = cache
+
+def clip_rfft(audio_data, sample_rate):
+    """rfft of one clip, from the spectrum cache when one is installed"""
+    if _spectrum_cache is not None:
+        return _spectrum_cache.rfft(audio_data, sample_rate)
+    return rfft(audio_data)
+
+# Number of clips whose spectral index is kept in memory
+SPECTRAL_INDEX_CACHE_SIZE = 64
+
+_spectral_index_cache = OrderedDict()
+
+class SpectralIndex:
+    """Cumulative power spectrum of one clip for constant-time band energy queries"""
+
+    def __init__(self, audio_data, sample_rate):
+        n = len(audio_data)
+        self.n = n
+        self.sample_rate = sample_rate
+        self.fft = clip_rfft(audio_data, sample_rate)
+        self.freqs = frequency_grid(n, sample_rate)
+        self.bin_width = sample_rate / n
+
+        self.power = parseval_power(self.fft, n)
+        self.cumulative_power = np.concatenate(([0.0], np.cumsum(self.power)))
+
+        peak_idx = np.argmax(np.abs(self.fft))
+        self.peak_frequency = float(self.freqs[peak_idx])
+
+    def _band_edge(self, freq, inclusive):
+        """Index of the first bin above freq (or at it, if inclusive)"""
+        freqs = self.freqs
+        k = min(max(int(np.ceil(freq / self.bin_width)), 0), len(freqs))
+        # Step over rounding differences between freq / bin_width and rfftfreq
+        if inclusive:
+            while k > 0 and freqs[k - 1] >= freq:
+                k -= 1
+            while k < len(freqs) and freqs[k] < freq:
+                k += 1
+        else:
+            while k > 0 and freqs[k - 1] > freq:
+                k -= 1
+            while k < len(freqs) and freqs[k] <= freq:
+                k += 1
+        return k
+
+    def band_energy(self, low_freq, high_freq, edge_width=0.0):
+        """Energy of the clip after a low_freq-high_freq bandpass, without an inverse FFT"""
+        if edge_width > 0:
+            mask = cached_band_mask(self.n, self.sample_rate, low_freq, high_freq, edge_width)
+            return float(np.dot(self.power, mask * mask))
+        start = self._band_edge(low_freq, inclusive=True)
+        stop = self._band_edge(high_freq, inclusive=False)
+        if stop <= start:
+            return 0.0
+        return float(self.cumulative_power[stop] - self.cumulative_power[start])
+
+def get_spectral_index(audio_data, sample_rate):
+    """Return the spectral index of a clip, reusing a cached one for identical content"""
+    audio_data = np.ascontiguousarray(audio_data)
+    digest = hashlib.blake2b(audio_data.tobytes(), digest_size=16)
+    digest.update(str(audio_data.dtype).encode())
+    key = (digest.hexdigest(), sample_rate)
+
+    index = _spectral_index_cache.get(key)
+    if index is not None:
+        metrics.increment("spectral_index_cache_hits")
+        _spectral_index_cache.move_to_end(key)
+        return index
+
+    metrics.increment("spectral_index_cache_misses")
+    index = SpectralIndex(audio_data, sample_rate)
+    _spectral_index_cache[key] = index
+    if len(_spectral_index_cache) > SPECTRAL_INDEX_CACHE_SIZE:
+        _spectral_index_cache.popitem(last=False)
+    return index
+
+@metrics.timed("apply")
 def apply(inputs: InputSchema) -> Dict[str, Any]:
     """Apply bandpass filter to audio signal"""
-    # Extract data from Pydantic model
-    audio_data = np.array(inputs.audio_data)
-    sample_rate = inputs.sample_rate
+    # Extract data from Pydantic model; the whole path stays float32 / complex64
+    audio_data = np.asarray(inputs.audio_data, dtype=np.float32)
+    metrics.observe_size("input_bytes", audio_data.nbytes)
+    if not inputs.decimate:
+        return apply_at_rate(inputs, audio_data, inputs.sample_rate)
+    
+    # Multirate path: filter a shorter signal at the lowest rate that covers the band
+    factor = decimation_factor(inputs.sample_rate, float(inputs.filter_params.high_freq))
+    with metrics.timer("decimate"):
+        audio_data = decimate_signal(audio_data, factor)
+    result = apply_at_rate(inputs, audio_data, inputs.sample_rate // factor)
+    # Energy sums over samples; each decimated sample stands for factor original ones
+    result["filter_energy"] *= factor
+    return result
+
+def apply_at_rate(inputs: InputSchema, audio_data, sample_rate) -> Dict[str, Any]:
+    """apply() on float32 samples at sample_rate, which differs from inputs.sample_rate after decimation"""
     low_freq = float(inputs.filter_params.low_freq)
     high_freq = float(inputs.filter_params.high_freq)
     
+    edge_width = float(inputs.edge_width)
+    
+    # Energy-only query: look the band up in the clip's cumulative power spectrum
+    if inputs.spectral_index:
+        index = get_spectral_index(audio_data, sample_rate)
+        result = {
+            "filtered_audio": audio_data[:0],
+            "filter_energy": index.band_energy(low_freq, high_freq, edge_width),
+            "peak_frequency": index.peak_frequency,
+            "sample_rate": sample_rate,
+            "magnitude_spectrum": None
+        }
+        if inputs.return_spectrum:
+            mask = cached_band_mask(index.n, sample_rate, low_freq, high_freq, edge_width)
+            result["magnitude_spectrum"] = np.abs(index.fft) * mask
+        return result
+    
+    # Time-domain engines filter the samples directly
+    if inputs.engine != "fft":
+        return apply_time_domain(inputs, audio_data, sample_rate)
+    
     # Simple frequency domain filtering
-    fft = np.fft.rfft(audio_data)
-    freqs = np.fft.rfftfreq(len(audio_data), 1/sample_rate)
+    fft = clip_rfft(audio_data, sample_rate)
+    freqs = frequency_grid(len(audio_data), sample_rate)
     
     # Find peak frequency
     if len(fft) > 0:
-        peak_idx = np.argmax(np.abs(fft))
-        peak_freq = float(freqs[peak_idx])
+        magnitude = np.abs(fft, out=work_buffer("magnitude", fft.shape, np.float32), casting="same_kind")
+        peak_freq = float(freqs[np.argmax(magnitude)])
     else:
         peak_freq = 0.0
     
-    # Apply filter in frequency domain
-    mask = (freqs >= low_freq) & (freqs <= high_freq)
-    fft_filtered = fft * mask
+    # Apply filter in frequency domain, into scratch space: fft may be a shared cached spectrum
+    mask = cached_band_mask(len(audio_data), sample_rate, low_freq, high_freq, edge_width)
+    fft_filtered = np.multiply(fft, mask, out=work_buffer("fft_filtered", fft.shape, np.complex64), casting="same_kind")
     
-    # Convert back to time domain
-    filtered_audio = np.fft.irfft(fft_filtered, len(audio_data))
-    
-    # Compute energy
-    filter_energy = float(np.sum(filtered_audio ** 2))
+    if inputs.return_filtered_audio and inputs.bands is None:
+        # Convert back to time domain
+        filtered_audio = irfft(fft_filtered, len(audio_data)).astype(np.float32, copy=False)
+        
+        # Compute energy without a squared copy
+        filter_energy = float(np.dot(filtered_audio, filtered_audio))
+    else:
+        # Spectrum-only consumers: take the energy from Parseval instead
+        filtered_audio = audio_data[:0]
+        filter_energy = parseval_energy(fft_filtered, len(audio_data))
     
     # Return as dictionary
+    result = {
+        "filtered_audio": filtered_audio,
+        "filter_energy": filter_energy,
+        "peak_frequency": peak_freq,
+        "sample_rate": sample_rate,
+        "magnitude_spectrum": np.abs(fft_filtered) if inputs.return_spectrum else None
+    }
+    if inputs.bands is not None:
+        # Every other requested band from the same FFT, as apply_batch does for a batch
+        bands = np.asarray(inputs.bands, dtype=np.float64).reshape(-1, 2)
+        result["band_energy"], result["band_filtered_audio"] = filter_bank(
+            fft, len(audio_data), freqs, bands, edge_width, inputs.return_filtered_audio)
+        if inputs.return_spectrum:
+            masks = band_mask(freqs, bands[:, :1], bands[:, 1:], edge_width)
+            result["band_magnitude_spectrum"] = np.abs(fft) * masks
+    return result
+
+def apply_time_domain(inputs: InputSchema, audio_data, sample_rate) -> Dict[str, Any]:
+    """apply() for the fir, butter and cheby1 engines"""
+    filtered_audio = filter_signal(
+        audio_data, sample_rate,
+        float(inputs.filter_params.low_freq), float(inputs.filter_params.high_freq),
+        inputs.engine, inputs.num_taps, inputs.filter_order, float(inputs.ripple_db)
+    ).astype(np.float32, copy=False)
+    filter_energy = float(np.dot(filtered_audio, filtered_audio))
+    
+    # Peak frequency is reported for the unfiltered clip, as with the fft engine
+    fft = clip_rfft(audio_data, sample_rate)
+    freqs = frequency_grid(len(audio_data), sample_rate)
+    peak_freq = float(freqs[np.argmax(np.abs(fft))]) if len(fft) else 0.0
+    
     return {
-        "filtered_audio": filtered_audio.tolist(),
+        "filtered_audio": filtered_audio if inputs.return_filtered_audio else audio_data[:0],
         "filter_energy": filter_energy,
         "peak_frequency": peak_freq,
+        "sample_rate": sample_rate,
+        "magnitude_spectrum": np.abs(rfft(filtered_audio)) if inputs.return_spectrum else None
+    }
+
+@metrics.timed("apply_batch")
+def apply_batch(inputs: BatchInputSchema) -> Dict[str, Any]:
+    """Evaluate N clips against M bands with one vectorized FFT over the batch"""
+    audio_batch = np.asarray(inputs.audio_batch)
+    metrics.observe_size("input_bytes", audio_batch.nbytes)
+    bands = np.asarray(inputs.bands).reshape(-1, 2)
+    sample_rate = inputs.sample_rate
+    n = audio_batch.shape[1]
+    
+    if _spectrum_cache is not None:
+        fft = _spectrum_cache.rfft_batch(audio_batch, sample_rate)
+    else:
+        fft = rfft(audio_batch, axis=1)
+    freqs = frequency_grid(n, sample_rate)
+    
+    peak_freqs = freqs[np.argmax(np.abs(fft), axis=1)]
+    filter_energy, filtered_audio = filter_bank(fft, n, freqs, bands, float(inputs.edge_width),
+                                                inputs.return_filtered_audio)
+    return {
+        "filter_energy": filter_energy,
+        "peak_frequency": peak_freqs,
+        "filtered_audio": filtered_audio,
         "sample_rate": sample_rate
     }
 
+def filter_bank(fft, n, freqs, bands, edge_width, return_filtered_audio):
+    """Energies (..., M) and, if requested, filtered signals (..., M, n) of rffts (..., F) through M bands"""
+    # One mask row per band, (M, F)
+    masks = band_mask(freqs, bands[:, :1], bands[:, 1:], edge_width)
+    
+    # Band energies for every (clip, band) pair in a single matrix product
+    gains = masks.astype(np.float64) ** 2
+    energy = parseval_power(fft, n) @ gains.T
+    
+    filtered_audio = None
+    if return_filtered_audio:
+        filtered_audio = irfft(fft[..., None, :] * masks, n, axis=-1)
+    return energy, filtered_audio
+
+# Multirate path: the decimated rate keeps high_freq below this fraction of its
+# Nyquist frequency, clear of the anti-alias filter's transition band
+DECIMATION_PASSBAND = 0.8
+MAX_DECIMATION = 32
+
+def decimation_factor(sample_rate, high_freq):
+    """Largest integer q <= MAX_DECIMATION dividing sample_rate with high_freq still in band at sample_rate / q"""
+    for factor in range(MAX_DECIMATION, 1, -1):
+        if sample_rate % factor == 0 and high_freq <= DECIMATION_PASSBAND * sample_rate / factor / 2:
+            return factor
+    return 1
+
+@lru_cache(maxsize=16)
+def design_decimator(factor):
+    """Read-only float32 anti-alias lowpass for decimation by factor, resample_poly's default design"""
+    from scipy import signal
+    taps = signal.firwin(20 * factor + 1, 1.0 / factor, window=("kaiser", 5.0)).astype(np.float32)
+    taps.setflags(write=False)
+    return taps
+
+def decimate_signal(audio_data, factor):
+    """Zero-phase polyphase anti-alias filtering and downsampling by an integer factor"""
+    if factor == 1:
+        return audio_data
+    from scipy import signal
+    return signal.resample_poly(audio_data, 1, factor, window=design_decimator(factor)).astype(np.float32, copy=False)
+
+FILTER_ENGINES = ("fft", "fir", "butter", "cheby1")
+
+@lru_cache(maxsize=32)
+def design_fir(sample_rate, low_freq, high_freq, num_taps):
+    """Hamming-windowed sinc bandpass taps from scipy.signal.firwin"""
+    from scipy import signal
+    taps = signal.firwin(num_taps, [low_freq, high_freq], pass_zero=False, fs=sample_rate)
+    taps.setflags(write=False)
+    return taps
+
+@lru_cache(maxsize=32)
+def design_sos(sample_rate, low_freq, high_freq, order, kind="butter", ripple_db=1.0):
+    """Butterworth or Chebyshev type I bandpass as second-order sections"""
+    from scipy import signal
+    band = [low_freq, high_freq]
+    if kind == "butter":
+        sos = signal.butter(order, band, btype="bandpass", output="sos", fs=sample_rate)
+    elif kind == "cheby1":
+        sos = signal.cheby1(order, ripple_db, band, btype="bandpass", output="sos", fs=sample_rate)
+    else:
+        raise ValueError("Unknown IIR design '%s', expected 'butter' or 'cheby1'" % kind)
+    sos.setflags(write=False)
+    return sos
+
+def filter_signal(audio_data, sample_rate, low_freq, high_freq, engine="fir", num_taps=DEFAULT_NUM_TAPS,
+                  filter_order=4, ripple_db=1.0):
+    """Bandpass a whole signal in the time domain with the fir, butter or cheby1 engine"""
+    from scipy import signal
+    if engine == "fir":
+        taps = design_fir(sample_rate, low_freq, high_freq, num_taps)
+        # mode="same" drops the (num_taps - 1) / 2 samples of group delay
+        return signal.oaconvolve(audio_data, taps.astype(np.result_type(audio_data, np.float32)), mode="same")
+    if engine in ("butter", "cheby1"):
+        sos = design_sos(sample_rate, low_freq, high_freq, filter_order, engine, ripple_db)
+        # sosfilt wants a writable array; copy the (tiny) cached design
+        return signal.sosfilt(np.array(sos), audio_data)
+    raise ValueError("Unknown time-domain engine '%s', expected one of %s" % (engine, FILTER_ENGINES[1:]))
+
+class StreamingFilter:
+    """Overlap-save bandpass filter that keeps its state between chunks
+
+    Audio is consumed in blocks of block_size samples, each advancing by
+    block_size - num_taps + 1 new samples, so memory is bounded by the
+    block size no matter how long the stream runs. Output sample i lines
+    up with input sample i, as in filter_signal's fir engine, but is only
+    emitted `delay` samples (the FIR group delay) after that input;
+    flush() emits the rest.
+    """
+
+    def __init__(self, sample_rate, low_freq, high_freq, block_size=8192, num_taps=DEFAULT_NUM_TAPS):
+        if num_taps >= block_size:
+            raise ValueError("num_taps must be smaller than block_size")
+        self.sample_rate = sample_rate
+        self.low_freq = float(low_freq)
+        self.high_freq = float(high_freq)
+        self.block_size = block_size
+        self.num_taps = num_taps
+        self.hop = block_size - num_taps + 1
+        self.delay = (num_taps - 1) // 2
+
+        # Same taps as filter_signal's fir engine, so streamed and whole-signal output agree
+        taps = design_fir(sample_rate, self.low_freq, self.high_freq, num_taps)
+        self._kernel_fft = rfft(taps, block_size)
+
+        # Last num_taps - 1 input samples, and input not yet filling a hop
+        self._history = np.zeros(num_taps - 1)
+        self._pending = np.zeros(0)
+        # Leading outputs that precede input sample 0 once the group delay is removed
+        self._lead = self.delay
+
+        self.energy = 0.0
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def _filter_block(self, new_samples, count=None):
+        """Filter one hop of new samples, keeping the outputs of the first count of them"""
+        block = np.concatenate((self._history, new_samples))
+        filtered = irfft(rfft(block) * self._kernel_fft, self.block_size)
+        # The first num_taps - 1 outputs are circular wrap-around; discard them
+        filtered = filtered[self.num_taps - 1:][:count]
+        self._history = block[len(block) - (self.num_taps - 1):]
+        skip = min(self._lead, len(filtered))
+        self._lead -= skip
+        filtered = filtered[skip:]
+        self.energy += float(np.dot(filtered, filtered))
+        self.samples_out += len(filtered)
+        return filtered
+
+    def process(self, chunk):
+        """Feed a chunk of samples; return the filtered samples that are ready"""
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        self.samples_in += len(chunk)
+        pending = np.concatenate((self._pending, chunk))
+
+        outputs = []
+        start = 0
+        while len(pending) - start >= self.hop:
+            outputs.append(self._filter_block(pending[start:start + self.hop]))
+            start += self.hop
+        self._pending = pending[start:]
+
+        if not outputs:
+            return np.zeros(0)
+        return np.concatenate(outputs)
+
+    def flush(self):
+        """Filter the input left over followed by `delay` zeros, emitting the remaining output"""
+        tail = np.concatenate((self._pending, np.zeros(self.delay)))
+        self._pending = np.zeros(0)
+        outputs = [np.zeros(0)]
+        for start in range(0, len(tail), self.hop):
+            new_samples = tail[start:start + self.hop]
+            count = len(new_samples)
+            # Zero-pad the final block; only outputs for the fed samples are kept
+            padded = np.concatenate((new_samples, np.zeros(self.hop - count)))
+            outputs.append(self._filter_block(padded, count))
+        return np.concatenate(outputs)
+
+class SOSStreamingFilter:
+    """Butterworth / Chebyshev bandpass that carries sosfilt state between chunks
+
+    Every input sample produces an output sample immediately, so there is
+    no block latency; the IIR phase response is not compensated (delay 0).
+    """
+
+    def __init__(self, sample_rate, low_freq, high_freq, filter_order=4, kind="butter", ripple_db=1.0):
+        self.sample_rate = sample_rate
+        self.low_freq = float(low_freq)
+        self.high_freq = float(high_freq)
+        self.delay = 0
+        # Private writable copy of the cached design, as sosfilt requires
+        self.sos = np.array(design_sos(sample_rate, self.low_freq, self.high_freq, filter_order, kind, ripple_db))
+        self._zi = np.zeros((self.sos.shape[0], 2))
+
+        self.energy = 0.0
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def process(self, chunk):
+        """Feed a chunk of samples; return the same number of filtered samples"""
+        from scipy import signal
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        filtered, self._zi = signal.sosfilt(self.sos, chunk, zi=self._zi)
+        self.energy += float(np.dot(filtered, filtered))
+        self.samples_in += len(chunk)
+        self.samples_out += len(filtered)
+        return filtered
+
+    def flush(self):
+        """Nothing is buffered; present for interface parity with StreamingFilter"""
+        return np.zeros(0)
+
+def stream_filter(chunks, sample_rate, low_freq, high_freq, block_size=8192, num_taps=DEFAULT_NUM_TAPS,
+                  engine="fft", filter_order=4, ripple_db=1.0):
+    """Filter an iterable of audio chunks, yielding (filtered_block, running_energy)
+
+    The fft and fir engines both stream through the overlap-save FIR;
+    butter and cheby1 carry their second-order-section state instead.
+    """
+    if engine in ("butter", "cheby1"):
+        state = SOSStreamingFilter(sample_rate, low_freq, high_freq, filter_order, engine, ripple_db)
+    elif engine in ("fft", "fir"):
+        state = StreamingFilter(sample_rate, low_freq, high_freq, block_size, num_taps)
+    else:
+        raise ValueError("Unknown filter engine '%s', expected one of %s" % (engine, FILTER_ENGINES))
+    for chunk in chunks:
+        filtered = state.process(chunk)
+        if len(filtered):
+            yield filtered, state.energy
+    filtered = state.flush()
+    if len(filtered):
+        yield filtered, state.energy
+
+@metrics.timed("jacobian")
 def jacobian(inputs: InputSchema, jac_inputs: List[str], jac_outputs: List[str]) -> Dict[str, Any]:
-    """Compute gradients for filter optimization"""
-    try:
-        log_debug("="*50)
-        log_debug(f"jacobian called!")
-        log_debug(f"inputs type: {type(inputs)}")
-        log_debug(f"jac_inputs: {jac_inputs}")
-        log_debug(f"jac_outputs: {jac_outputs}")
-        
-        # Try to understand the input structure
-        if hasattr(inputs, 'filter_params'):
-            log_debug(f"inputs.filter_params.low_freq: {inputs.filter_params.low_freq}")
-            log_debug(f"inputs.filter_params.high_freq: {inputs.filter_params.high_freq}")
-        
-        # Initialize result
-        result = {}
-        
-        # Simple test: return minimal structure
-        if "filter_energy" in jac_outputs:
-            for jac_input in jac_inputs:
-                log_debug(f"Processing jac_input: {jac_input}")
-                
+    """Compute gradients of the filter outputs in closed form
+
+    The brick-wall mask is piecewise constant in the cutoffs, so when
+    edge_width is 0 the band edges are differentiated through their
+    sigmoid relaxation one frequency bin wide.
+    """
+    if inputs.engine != "fft":
+        raise ValueError("Gradients are only available for the fft engine, not '%s'" % inputs.engine)
+    if inputs.decimate:
+        raise ValueError("Gradients are only available at the full sample rate, without decimate")
+    audio_data = np.asarray(inputs.audio_data)
+    sample_rate = inputs.sample_rate
+    low_freq = float(inputs.filter_params.low_freq)
+    high_freq = float(inputs.filter_params.high_freq)
+    n = len(audio_data)
+    
+    fft = clip_rfft(audio_data, sample_rate)
+    freqs = frequency_grid(n, sample_rate)
+    edge_width = float(inputs.edge_width) or sample_rate / n
+    _, d_low, d_high = band_mask_gradients(freqs, low_freq, high_freq, edge_width)
+    mask = cached_band_mask(n, sample_rate, low_freq, high_freq, float(inputs.edge_width))
+    
+    power = parseval_power(fft, n)
+    
+    result = {}
+    for jac_output in jac_outputs:
+        result[jac_output] = {}
+        for jac_input in jac_inputs:
+            if jac_output == "filter_energy":
+                # E = sum_k power_k * mask_k^2
                 if jac_input == "filter_params.low_freq":
-                    result[jac_input] = {"filter_energy": -0.1}
+                    grad = float(np.dot(power, 2 * mask * d_low))
                 elif jac_input == "filter_params.high_freq":
-                    result[jac_input] = {"filter_energy": 0.1}
+                    grad = float(np.dot(power, 2 * mask * d_high))
                 elif jac_input == "audio_data":
-                    # For array inputs, gradient should be an array
-                    audio_len = len(inputs.audio_data)
-                    # Return gradient as array
-                    gradient_array = [0.0] * audio_len
-                    gradient_array[0] = 0.001  # Just a test value
-                    result[jac_input] = {"filter_energy": gradient_array}
-        
-        log_debug(f"Returning result keys: {list(result.keys())}")
-        log_debug(f"Result structure: {json.dumps(result, default=str)[:500]}")
-        
-        return result
-        
-    except Exception as e:
-        log_debug(f"ERROR in jacobian: {type(e).__name__}: {str(e)}")
-        log_debug(f"Traceback: {traceback.format_exc()}")
-        raise
+                    # E = ||A x||^2 with A symmetric, so dE/dx = 2 A^2 x
+                    grad = 2 * irfft(fft * (mask * mask), n)
+                else:
+                    raise ValueError("Cannot differentiate with respect to %s" % jac_input)
+            elif jac_output == "filtered_audio":
+                # d(irfft(fft * mask))/d(cutoff) = irfft(fft * d(mask)/d(cutoff))
+                if jac_input == "filter_params.low_freq":
+                    grad = irfft(fft * d_low, n)
+                elif jac_input == "filter_params.high_freq":
+                    grad = irfft(fft * d_high, n)
+                else:
+                    raise ValueError(
+                        "Jacobian of filtered_audio with respect to %s is not supported" % jac_input
+                    )
+            else:
+                raise ValueError("Cannot differentiate %s" % jac_output)
+            result[jac_output][jac_input] = grad
+    
+    return result
 
+# JSON schemas are generated on first request and then reused; callers must not modify them
+@lru_cache(maxsize=None)
 def schema_input():
     return InputSchema.model_json_schema()
 
+@lru_cache(maxsize=None)
 def schema_output():
     return OutputSchema.model_json_schema()
\ No newline at end of file
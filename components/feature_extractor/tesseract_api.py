@@ -1,6 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from functools import lru_cache
 import numpy as np
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+from typing_extensions import Self
 
 # Handle imports for build time
 try:
@@ -14,71 +16,340 @@ except ImportError:
     def Array(shape, dtype):
         return list
 
+# Copied into the image next to this file (tesseract_config.yaml package_data)
+from component_support import Metrics, work_buffer
+
+metrics = Metrics("feature-extractor")
+
+# Per-frame features, in column order of frame_features
+FRAME_FEATURES = ("rms", "zcr", "centroid", "bandwidth", "rolloff", "flatness", "flux")
+
+# Frequency-valued columns are divided by this to keep them on the scale of the others
+FREQUENCY_SCALE = 10000.0
+
+# Divisors applied to each FRAME_FEATURES column before aggregation
+FEATURE_SCALES = np.array([1.0, 1.0, FREQUENCY_SCALE, FREQUENCY_SCALE, FREQUENCY_SCALE, 1.0, 1.0])
+
+# Frame means (plus clip peak amplitude), then frame standard deviations, then frame maxima
+MAX_FEATURE_DIM = 1 + 3 * len(FRAME_FEATURES)
+
 class InputSchema(BaseModel):
-    filtered_audio: Differentiable[Array[(None,), Float32]] = Field(
-        description="Filtered audio signal from previous stage"
+    filtered_audio: Optional[Differentiable[Array[(None,), Float32]]] = Field(
+        description="Filtered audio signal from previous stage",
+        default=None
+    )
+    magnitude_spectrum: Optional[Array[(None,), Float32]] = Field(
+        description="Masked magnitude spectrum from audio-filter, used in place of "
+                    "filtered_audio when only spectral features are needed",
+        default=None
+    )
+    signal_length: Optional[int] = Field(
+        description="Length in samples of the clip magnitude_spectrum was computed from",
+        default=None,
+        ge=1
     )
     sample_rate: int = Field(
-        description="Sample rate in Hz",
+        description="Sample rate in Hz; below 8 kHz only for signals audio-filter decimated",
+        ge=100
+    )
+    reference_sample_rate: Optional[int] = Field(
+        description="Original rate of a signal audio-filter decimated: frame and hop lengths, "
+                    "zero-crossing rates and spectral flatness are then computed as they would "
+                    "be at this rate, so features line up with the full-rate path",
+        default=None,
         ge=8000
     )
+    frame_length: int = Field(
+        description="STFT frame length in samples",
+        default=2048,
+        ge=16
+    )
+    hop_length: int = Field(
+        description="Samples between consecutive frames",
+        default=512,
+        ge=1
+    )
+    feature_dim: int = Field(
+        description="Length of the aggregated feature vector",
+        default=10,
+        ge=1,
+        le=MAX_FEATURE_DIM
+    )
+    rolloff_percent: Float32 = Field(
+        description="Fraction of spectral magnitude below the rolloff frequency",
+        default=0.85,
+        gt=0.0,
+        lt=1.0
+    )
+    return_frames: bool = Field(
+        description="Also return the per-frame feature matrix",
+        default=False
+    )
+    
+    @model_validator(mode='after')
+    def validate_source(self) -> Self:
+        if self.filtered_audio is None and self.magnitude_spectrum is None:
+            raise ValueError('Either filtered_audio or magnitude_spectrum is required')
+        if self.filtered_audio is None and self.signal_length is None:
+            raise ValueError('signal_length is required with magnitude_spectrum')
+        if self.reference_sample_rate is not None and self.reference_sample_rate < self.sample_rate:
+            raise ValueError('reference_sample_rate must not be below sample_rate')
+        if self.reference_sample_rate is None and self.sample_rate < 8000:
+            raise ValueError('sample_rate below 8000 Hz needs reference_sample_rate')
+        return self
 
 class AudioFeatures(BaseModel):
     rms_energy: Differentiable[Float32] = Field(description="Root mean square energy")
-    peak_amplitude: Differentiable[Float32] = Field(description="Maximum absolute amplitude")
+    peak_amplitude: Optional[Differentiable[Float32]] = Field(
+        description="Maximum absolute amplitude; None for features from a magnitude spectrum",
+        default=None
+    )
     zero_crossing_rate: Float32 = Field(description="Zero crossing rate")
     spectral_centroid: Float32 = Field(description="Spectral centroid frequency")
+    spectral_bandwidth: Float32 = Field(description="Mean spectral bandwidth in Hz", default=0.0)
+    spectral_rolloff: Float32 = Field(description="Mean spectral rolloff frequency in Hz", default=0.0)
+    spectral_flatness: Float32 = Field(description="Mean spectral flatness (0-1)", default=0.0)
+    spectral_flux: Float32 = Field(description="Mean frame-to-frame spectral flux", default=0.0)
 
 class OutputSchema(BaseModel):
     features: AudioFeatures = Field(
         description="Extracted audio features"
     )
-    feature_vector: Differentiable[Array[(10,), Float32]] = Field(
+    feature_vector: Differentiable[Array[(None,), Float32]] = Field(
         description="Feature vector for pattern matching"
     )
+    frame_features: Optional[Array[(None, len(FRAME_FEATURES)), Float32]] = Field(
+        description="Per-frame features (frames, %s), if requested" % ", ".join(FRAME_FEATURES),
+        default=None
+    )
+
+@lru_cache(maxsize=8)
+def analysis_window(frame_length):
+    """Read-only float32 Hann window"""
+    window = np.hanning(frame_length).astype(np.float32)
+    window.setflags(write=False)
+    return window
+
+def sign_changes(audio):
+    """Where np.sign(audio) differs between neighbouring samples, (len(audio) - 1,) bool"""
+    # int8 signs rather than np.sign's copy in the input dtype
+    signs = (audio > 0).view(np.int8) - (audio < 0).view(np.int8)
+    return signs[1:] != signs[:-1]
+
+def frame_signal(audio, frame_length, hop_length):
+    """Strided (frames, frame_length) view of the signal, zero-padded to at least one frame"""
+    if len(audio) < frame_length:
+        audio = np.concatenate((audio, np.zeros(frame_length - len(audio), dtype=audio.dtype)))
+    return np.lib.stride_tricks.sliding_window_view(audio, frame_length)[::hop_length]
+
+# Frames analysed per block; bounds the (frames, bins) work arrays regardless of clip length
+FRAME_BLOCK_SIZE = 128
+
+def compute_frame_features(audio, sample_rate, frame_length, hop_length, rolloff_percent,
+                           reference_frame_length=None):
+    """Per-frame RMS, ZCR, centroid, bandwidth, rolloff, flatness and flux in one pass
+
+    Spectra are computed FRAME_BLOCK_SIZE frames at a time in per-thread
+    work buffers updated in place, so memory is bounded by the block
+    rather than the clip. For a decimated signal, reference_frame_length
+    is the frame length at the original rate: ZCR is per original sample
+    and flatness counts the bins above the decimated Nyquist as empty.
+    """
+    reference_frame_length = reference_frame_length or frame_length
+    if len(audio) < frame_length:
+        audio = np.concatenate((audio, np.zeros(frame_length - len(audio), dtype=audio.dtype)))
+    frames = frame_signal(audio, frame_length, hop_length)
+    n_frames = len(frames)
+    table = np.empty((n_frames, len(FRAME_FEATURES)))
+    
+    table[:, 0] = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_length)
+    
+    # Sign changes inside each frame from a running count over the whole clip
+    changes = np.concatenate(([0], np.cumsum(sign_changes(audio), dtype=np.int32)))
+    starts = np.arange(n_frames) * hop_length
+    table[:, 1] = (changes[starts + frame_length - 1] - changes[starts]) / (reference_frame_length - 1)
+    
+    window = analysis_window(frame_length)
+    freqs = np.fft.rfftfreq(frame_length, 1/sample_rate)
+    previous = None
+    for first in range(0, n_frames, FRAME_BLOCK_SIZE):
+        block = frames[first:first + FRAME_BLOCK_SIZE]
+        previous = spectral_block_features(block, window, freqs, rolloff_percent, previous,
+                                           table[first:first + len(block)],
+                                           reference_frame_length // 2 + 1)
+    return table
+
+def spectral_block_features(frames, window, freqs, rolloff_percent, previous, out, flatness_bins=None):
+    """Fill columns 2: of out for one block of frames
 
+    previous is the last normalized spectrum of the preceding block (None
+    for the first), for flux across the block boundary; the block's own
+    last normalized spectrum is returned for the next call. Flatness is
+    taken over flatness_bins bins (default: those of the frames), the
+    missing ones at the power floor.
+    """
+    windowed = np.multiply(frames, window, out=work_buffer("windowed", frames.shape, np.float32),
+                           casting="same_kind")
+    with metrics.timer("fft"):
+        spectrum = np.fft.rfft(windowed, axis=1)
+    magnitude = np.abs(spectrum)
+    dtype = magnitude.dtype
+    freqs = freqs.astype(dtype)
+    total = magnitude.sum(axis=1)
+    silent = total <= 0
+    safe_total = np.where(silent, 1.0, total).astype(dtype)
+    
+    centroid = magnitude @ freqs / safe_total
+    spread = np.subtract(freqs[None, :], centroid[:, None],
+                         out=work_buffer("spectrum", magnitude.shape, dtype))
+    np.square(spread, out=spread)
+    out[:, 2] = centroid
+    out[:, 3] = np.sqrt(np.einsum("ij,ij->i", magnitude, spread) / safe_total)
+    
+    cumulative = np.cumsum(magnitude, axis=1, out=work_buffer("spectrum", magnitude.shape, dtype))
+    out[:, 4] = freqs[np.argmax(cumulative >= (rolloff_percent * total)[:, None], axis=1)]
+    
+    # Geometric over arithmetic mean of the power spectrum
+    power = np.square(magnitude, out=work_buffer("spectrum", magnitude.shape, dtype))
+    power += 1e-12
+    bins = flatness_bins or power.shape[1]
+    empty = bins - power.shape[1]
+    mean_power = (power.sum(axis=1) + empty * 1e-12) / bins
+    out[:, 5] = np.exp((np.log(power, out=power).sum(axis=1) + empty * np.log(1e-12)) / bins) / mean_power
+    
+    # L2 distance between consecutive normalized magnitude spectra
+    magnitude /= safe_total[:, None]
+    out[:, 6] = 0.0
+    if previous is not None:
+        step = magnitude[0] - previous
+        out[0, 6] = np.sqrt(np.dot(step, step))
+    if len(magnitude) > 1:
+        step = np.subtract(magnitude[1:], magnitude[:-1],
+                           out=work_buffer("flux", (len(magnitude) - 1, magnitude.shape[1]), dtype))
+        out[1:, 6] = np.sqrt(np.einsum("ij,ij->i", step, step))
+    
+    out[silent, 2:6] = 0.0
+    return magnitude[-1].copy()
+
+def spectrum_features(magnitude, signal_length, sample_rate, rolloff_percent, reference_sample_rate=None):
+    """Feature table row for a whole clip given only its magnitude spectrum
+
+    The clip is treated as a single frame: flux is zero, and the
+    zero-crossing rate is the expected rate 2 * f_rms / sample_rate of a
+    signal with this power spectrum. With reference_sample_rate, ZCR and
+    flatness are those of the clip at that rate (see compute_frame_features).
+    """
+    reference_sample_rate = reference_sample_rate or sample_rate
+    freqs = np.fft.rfftfreq(signal_length, 1/sample_rate)
+    
+    # Parseval: every bin except DC and Nyquist stands for a +/- pair
+    weights = np.full(len(magnitude), 2.0)
+    weights[0] = 1.0
+    if signal_length % 2 == 0:
+        weights[-1] = 1.0
+    power = weights * magnitude ** 2 / signal_length
+    energy = power.sum()
+    rms = np.sqrt(energy / signal_length)
+    
+    total = magnitude.sum()
+    if total <= 0:
+        return np.zeros((1, len(FRAME_FEATURES)))
+    
+    zcr = 2.0 * np.sqrt(np.dot(power, freqs ** 2) / energy) / reference_sample_rate
+    centroid = np.dot(magnitude, freqs) / total
+    bandwidth = np.sqrt(np.dot(magnitude, (freqs - centroid) ** 2) / total)
+    rolloff = freqs[np.argmax(np.cumsum(magnitude) >= rolloff_percent * total)]
+    squared = magnitude ** 2 + 1e-12
+    bins = int(round(signal_length * reference_sample_rate / sample_rate)) // 2 + 1
+    empty = max(bins - len(squared), 0)
+    flatness = (np.exp((np.log(squared).sum() + empty * np.log(1e-12)) / bins)
+                / ((squared.sum() + empty * 1e-12) / bins))
+    
+    return np.array([[rms, zcr, centroid, bandwidth, rolloff, flatness, 0.0]])
+
+def aggregate_features(frame_table, peak_amplitude, feature_dim):
+    """Summarize the per-frame table into a fixed-length feature vector
+
+    A peak_amplitude of None (no waveform to measure it on) leaves its
+    slot out, so every later feature moves up by one.
+    """
+    scaled = frame_table / FEATURE_SCALES
+    means = scaled.mean(axis=0)
+    vector = np.concatenate((
+        means[:1], [] if peak_amplitude is None else [peak_amplitude], means[1:],
+        scaled.std(axis=0),
+        scaled.max(axis=0)
+    ))
+    return vector[:feature_dim].astype(np.float32)
+
+def apply_spectrum(inputs: InputSchema) -> Dict[str, Any]:
+    """Extract spectral features from audio-filter's magnitude spectrum, with no FFT"""
+    magnitude = np.asarray(inputs.magnitude_spectrum)
+    frame_table = spectrum_features(
+        magnitude, inputs.signal_length, inputs.sample_rate, float(inputs.rolloff_percent),
+        inputs.reference_sample_rate
+    )
+    rms_energy, zero_crossing_rate, centroid, bandwidth, rolloff, flatness, flux = frame_table[0]
+    
+    return {
+        "features": {
+            "rms_energy": float(rms_energy),
+            "peak_amplitude": None,
+            "zero_crossing_rate": float(zero_crossing_rate),
+            "spectral_centroid": float(centroid),
+            "spectral_bandwidth": float(bandwidth),
+            "spectral_rolloff": float(rolloff),
+            "spectral_flatness": float(flatness),
+            "spectral_flux": float(flux)
+        },
+        "feature_vector": aggregate_features(frame_table, None, inputs.feature_dim),
+        "frame_features": frame_table if inputs.return_frames else None
+    }
+
+@metrics.timed("apply")
 def apply(inputs: InputSchema) -> Dict[str, Any]:
     """Extract acoustic features from filtered audio"""
-    # Extract from Pydantic model
-    audio = np.array(inputs.filtered_audio)
+    if inputs.filtered_audio is None:
+        return apply_spectrum(inputs)
+    
+    # Extract from Pydantic model; float32 throughout
+    audio = np.asarray(inputs.filtered_audio, dtype=np.float32)
+    metrics.observe_size("input_bytes", audio.nbytes)
     sample_rate = inputs.sample_rate
     
-    # Compute features
+    # A decimated signal is framed over the same durations as at its original rate
+    frame_length = inputs.frame_length
+    hop_length = inputs.hop_length
+    ratio = 1.0
+    if inputs.reference_sample_rate is not None:
+        ratio = inputs.reference_sample_rate / sample_rate
+        frame_length = max(16, int(round(inputs.frame_length / ratio)))
+        hop_length = max(1, int(round(inputs.hop_length / ratio)))
+    
+    # Whole-clip amplitude features, without squared or absolute copies
     if len(audio) > 0:
-        rms_energy = float(np.sqrt(np.mean(audio**2)))
-        peak_amplitude = float(np.max(np.abs(audio)))
+        rms_energy = float(np.sqrt(np.dot(audio, audio) / len(audio)))
+        peak_amplitude = float(max(audio.max(), -audio.min()))
     else:
         rms_energy = 0.0
         peak_amplitude = 0.0
     
     # Zero crossing rate
     if len(audio) > 1:
-        zero_crossings = np.sum(np.diff(np.sign(audio)) != 0)
-        zero_crossing_rate = float(zero_crossings / len(audio))
+        zero_crossings = np.count_nonzero(sign_changes(audio))
+        zero_crossing_rate = float(zero_crossings / (len(audio) * ratio))
     else:
         zero_crossing_rate = 0.0
     
-    # Spectral features
-    if len(audio) > 0:
-        fft = np.fft.rfft(audio)
-        freqs = np.fft.rfftfreq(len(audio), 1/sample_rate)
-        magnitude = np.abs(fft)
-        
-        if np.sum(magnitude) > 0:
-            spectral_centroid = float(np.sum(freqs * magnitude) / np.sum(magnitude))
-        else:
-            spectral_centroid = 0.0
-    else:
-        spectral_centroid = 0.0
+    # Short-time features over a strided frame view
+    frame_table = compute_frame_features(
+        audio, sample_rate, frame_length, hop_length, float(inputs.rolloff_percent),
+        inputs.frame_length
+    )
+    frame_means = frame_table.mean(axis=0)
     
     # Create feature vector
-    feature_vector = [
-        rms_energy,
-        peak_amplitude,
-        zero_crossing_rate,
-        spectral_centroid / 10000.0,  # Normalize
-        0.0, 0.0, 0.0, 0.0, 0.0, 0.0  # Padding to 10 features
-    ]
+    feature_vector = aggregate_features(frame_table, peak_amplitude, inputs.feature_dim)
     
     # Return as dictionary
     return {
@@ -86,13 +357,21 @@ def apply(inputs: InputSchema) -> Dict[str, Any]:
             "rms_energy": rms_energy,
             "peak_amplitude": peak_amplitude,
             "zero_crossing_rate": zero_crossing_rate,
-            "spectral_centroid": spectral_centroid
+            "spectral_centroid": float(frame_means[2]),
+            "spectral_bandwidth": float(frame_means[3]),
+            "spectral_rolloff": float(frame_means[4]),
+            "spectral_flatness": float(frame_means[5]),
+            "spectral_flux": float(frame_means[6])
         },
-        "feature_vector": feature_vector
+        "feature_vector": feature_vector,
+        "frame_features": frame_table if inputs.return_frames else None
     }
 
+# JSON schemas are generated on first request and then reused; callers must not modify them
+@lru_cache(maxsize=None)
 def schema_input():
     return InputSchema.model_json_schema()
 
+@lru_cache(maxsize=None)
 def schema_output():
     return OutputSchema.model_json_schema()
\ No newline at end of file
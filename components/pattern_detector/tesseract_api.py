@@ -1,24 +1,34 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
 import numpy as np
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+from typing_extensions import Self
 
 # Handle imports for build time
 try:
-    from tesseract_core.runtime import Array, Differentiable, Float32
+    from tesseract_core.runtime import Array, Differentiable, Float32, Int64
 except ImportError:
     from typing import TypeVar, Generic
     T = TypeVar('T')
     class Differentiable(Generic[T]):
         pass
     Float32 = float
+    Int64 = int
     def Array(shape, dtype):
         return list
 
+# Copied into the image next to this file (tesseract_config.yaml package_data)
+from component_support import Metrics
+
+metrics = Metrics("pattern-detector")
+
 class InputSchema(BaseModel):
-    feature_vector: Differentiable[Array[(10,), Float32]] = Field(
+    feature_vector: Differentiable[Array[(None,), Float32]] = Field(
         description="Feature vector from audio analysis"
     )
-    target_pattern: Array[(10,), Float32] = Field(
+    target_pattern: Array[(None,), Float32] = Field(
         description="Target pattern to match against"
     )
     detection_threshold: Float32 = Field(
@@ -27,6 +37,25 @@ class InputSchema(BaseModel):
         ge=0.0,
         le=1.0
     )
+    feature_vectors: Optional[Array[(None, None), Float32]] = Field(
+        description="Also score these feature vectors (N, D) against target_patterns, as "
+                    "apply_bank does; the results are bank_similarity and bank_is_match",
+        default=None
+    )
+    target_patterns: Optional[Array[(None, None), Float32]] = Field(
+        description="Bank of target patterns (K, D) for feature_vectors",
+        default=None
+    )
+    
+    @model_validator(mode='after')
+    def validate_lengths(self) -> Self:
+        if len(self.feature_vector) != len(self.target_pattern):
+            raise ValueError('feature_vector and target_pattern must have the same length')
+        if (self.feature_vectors is None) != (self.target_patterns is None):
+            raise ValueError('feature_vectors and target_patterns must be given together')
+        if self.feature_vectors is not None and self.feature_vectors.shape[1] != self.target_patterns.shape[1]:
+            raise ValueError('feature_vectors and target_patterns must have the same width')
+        return self
 
 class OutputSchema(BaseModel):
     is_match: bool = Field(
@@ -38,12 +67,374 @@ class OutputSchema(BaseModel):
     confidence: Differentiable[Float32] = Field(
         description="Detection confidence (0-1)"
     )
+    bank_similarity: Optional[Array[(None, None), Float32]] = Field(
+        description="Cosine similarity of every feature_vectors row with every target_patterns row (N, K)",
+        default=None
+    )
+    bank_is_match: Optional[Array[(None, None), "bool"]] = Field(
+        description="Whether each bank similarity is above detection_threshold (N, K)",
+        default=None
+    )
+
+class BankInputSchema(BaseModel):
+    feature_vectors: Array[(None, None), Float32] = Field(
+        description="Batch of feature vectors, one per row (N, D)"
+    )
+    target_patterns: Array[(None, None), Float32] = Field(
+        description="Bank of target patterns, one per row (K, D)"
+    )
+    pattern_names: Optional[List[str]] = Field(
+        description="Name of each target pattern (K,)",
+        default=None
+    )
+    detection_thresholds: Optional[Array[(None,), Float32]] = Field(
+        description="Per-pattern similarity thresholds (K,); defaults to detection_threshold",
+        default=None
+    )
+    detection_threshold: Float32 = Field(
+        description="Similarity threshold for patterns without their own",
+        default=0.8,
+        ge=0.0,
+        le=1.0
+    )
+    
+    @model_validator(mode='after')
+    def validate_bank(self) -> Self:
+        n_patterns, dim = self.target_patterns.shape
+        if self.feature_vectors.shape[1] != dim:
+            raise ValueError('feature_vectors and target_patterns must have the same width')
+        if self.pattern_names is not None and len(self.pattern_names) != n_patterns:
+            raise ValueError('pattern_names must have one entry per target pattern')
+        if self.detection_thresholds is not None and len(self.detection_thresholds) != n_patterns:
+            raise ValueError('detection_thresholds must have one entry per target pattern')
+        return self
+
+class BankOutputSchema(BaseModel):
+    similarity_scores: Array[(None, None), Float32] = Field(
+        description="Cosine similarity of every feature vector with every pattern (N, K)"
+    )
+    is_match: Array[(None, None), "bool"] = Field(
+        description="Whether each similarity is above its pattern's threshold (N, K)"
+    )
+    best_match: Array[(None,), Int64] = Field(
+        description="Index of the most similar pattern for each feature vector (N,)"
+    )
+    best_score: Array[(None,), Float32] = Field(
+        description="Similarity with the most similar pattern (N,)"
+    )
+    best_name: Optional[List[Optional[str]]] = Field(
+        description="Name of the most similar pattern if it matches, else null (N,)",
+        default=None
+    )
+
+class SearchInputSchema(BaseModel):
+    feature_vectors: Array[(None, None), Float32] = Field(
+        description="Batch of feature vectors, one per row (N, D)"
+    )
+    target_patterns: Array[(None, None), Float32] = Field(
+        description="Bank of target patterns, one per row (K, D)"
+    )
+    k: int = Field(
+        description="Number of most similar patterns to return per feature vector",
+        default=5,
+        ge=1
+    )
+    n_probe: Optional[int] = Field(
+        description="Clusters scanned per query once the bank is large enough to be clustered",
+        default=None,
+        ge=1
+    )
+    detection_threshold: Float32 = Field(
+        description="Similarity threshold for a match",
+        default=0.8,
+        ge=0.0,
+        le=1.0
+    )
+    
+    @model_validator(mode='after')
+    def validate_width(self) -> Self:
+        if self.feature_vectors.shape[1] != self.target_patterns.shape[1]:
+            raise ValueError('feature_vectors and target_patterns must have the same width')
+        return self
+
+class SearchOutputSchema(BaseModel):
+    pattern_rows: Array[(None, None), Int64] = Field(
+        description="Rows of target_patterns most similar to each feature vector, best first; "
+                    "-1 where the probed clusters held fewer than k patterns (N, k)"
+    )
+    similarity_scores: Array[(None, None), Float32] = Field(
+        description="Cosine similarity with each of those patterns (N, k)"
+    )
+    is_match: Array[(None, None), "bool"] = Field(
+        description="Whether each similarity is above detection_threshold (N, k)"
+    )
+
+# Number of pattern banks whose normalized rows are kept in memory
+PATTERN_BANK_CACHE_SIZE = 8
+
+_normalized_bank_cache = OrderedDict()
+
+def normalize_rows(matrix):
+    """Scale rows to unit length; all-zero rows stay zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
 
+def bank_key(target_patterns):
+    """Content hash of a pattern bank"""
+    target_patterns = np.ascontiguousarray(target_patterns)
+    digest = hashlib.blake2b(target_patterns.tobytes(), digest_size=16)
+    digest.update(str(target_patterns.shape).encode())
+    return digest.hexdigest()
+
+def normalized_patterns(target_patterns):
+    """Unit-length pattern rows, cached per bank content"""
+    key = bank_key(target_patterns)
+    
+    normalized = _normalized_bank_cache.get(key)
+    if normalized is not None:
+        metrics.increment("pattern_bank_cache_hits")
+        _normalized_bank_cache.move_to_end(key)
+        return normalized
+    
+    metrics.increment("pattern_bank_cache_misses")
+    normalized = normalize_rows(target_patterns)
+    _normalized_bank_cache[key] = normalized
+    if len(_normalized_bank_cache) > PATTERN_BANK_CACHE_SIZE:
+        _normalized_bank_cache.popitem(last=False)
+    return normalized
+
+@metrics.timed("apply_bank")
+def apply_bank(inputs: BankInputSchema) -> Dict[str, Any]:
+    """Score N feature vectors against K patterns with one normalized matrix multiply"""
+    feature_vectors = np.asarray(inputs.feature_vectors)
+    patterns = normalized_patterns(inputs.target_patterns)
+    
+    if inputs.detection_thresholds is not None:
+        thresholds = np.asarray(inputs.detection_thresholds)
+    else:
+        thresholds = np.full(len(patterns), float(inputs.detection_threshold))
+    
+    similarity = normalize_rows(feature_vectors) @ patterns.T
+    is_match = similarity > thresholds[None, :]
+    
+    rows = np.arange(len(similarity))
+    best_match = np.argmax(similarity, axis=1)
+    best_score = similarity[rows, best_match]
+    
+    best_name = None
+    if inputs.pattern_names is not None:
+        best_name = [
+            inputs.pattern_names[k] if is_match[i, k] else None
+            for i, k in zip(rows, best_match)
+        ]
+    
+    return {
+        "similarity_scores": similarity,
+        "is_match": is_match,
+        "best_match": best_match,
+        "best_score": best_score,
+        "best_name": best_name
+    }
+
+class PatternIndex:
+    """Inverted-file index over unit-length patterns for top-k cosine queries
+
+    Patterns are clustered with spherical k-means; a query scores the
+    centroids, then only the patterns in its n_probe closest clusters.
+    Raising n_probe trades latency for recall. Indexes holding at most
+    exact_threshold patterns are searched exhaustively.
+    """
+
+    def __init__(self, dim, n_lists=None, n_probe=8, exact_threshold=4096,
+                 kmeans_iterations=10, seed=0):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.exact_threshold = exact_threshold
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int64)
+        self._next_id = 0
+        self._lists = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self):
+        """Cluster the current patterns and assign every pattern to a list"""
+        n = len(self.vectors)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(self.seed)
+        centroids = self.vectors[rng.choice(n, n_lists, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.vectors)
+            # Empty clusters keep their previous centroid
+            empty = ~np.any(sums, axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums).astype(np.float32)
+        self.centroids = centroids
+        self.assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+        self._lists = None
+
+    def add(self, vectors, ids=None):
+        """Add patterns (n, dim); returns their ids, which must be new and distinct"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        if ids is None:
+            ids = np.arange(self._next_id, self._next_id + len(vectors))
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        if len(ids) != len(vectors):
+            raise ValueError("Got %d ids for %d patterns" % (len(ids), len(vectors)))
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("Duplicate ids in add()")
+        existing = np.intersect1d(ids, self.ids)
+        if len(existing):
+            raise ValueError("Ids already in the index: %s; remove() them first" % existing.tolist())
+        self._next_id = max(self._next_id, int(ids.max()) + 1) if len(ids) else self._next_id
+
+        self.vectors = np.concatenate((self.vectors, vectors.astype(np.float32)))
+        self.ids = np.concatenate((self.ids, ids))
+        if self.is_trained:
+            new_assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+            self.assignments = np.concatenate((self.assignments, new_assignments))
+            self._lists = None
+        elif len(self.vectors) > self.exact_threshold:
+            self.train()
+        return ids
+
+    def remove(self, ids):
+        """Remove patterns by id; unknown ids are ignored"""
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        self.vectors = self.vectors[keep]
+        self.ids = self.ids[keep]
+        if self.is_trained:
+            self.assignments = self.assignments[keep]
+        self._lists = None
+
+    def _inverted_lists(self):
+        """Row indices grouped by list, as (order, offsets) from a stable sort"""
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            counts = np.bincount(self.assignments, minlength=len(self.centroids))
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._lists = (order, offsets)
+        return self._lists
+
+    @staticmethod
+    def _top_k(scores, k):
+        k = min(k, scores.shape[-1])
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        top_scores = np.take_along_axis(scores, top, axis=-1)
+        order = np.argsort(-top_scores, axis=-1)
+        return np.take_along_axis(top, order, axis=-1), np.take_along_axis(top_scores, order, axis=-1)
+
+    @metrics.timed("index_search")
+    def search(self, queries, k=5, n_probe=None):
+        """Top-k patterns by cosine similarity; returns (ids, scores), each (Q, k)"""
+        queries = normalize_rows(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        if len(self.ids) == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0))
+
+        if not self.is_trained or len(self.ids) <= self.exact_threshold:
+            rows, scores = self._top_k(queries @ self.vectors.T, k)
+            return self.ids[rows], scores
+
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes, _ = self._top_k(queries @ self.centroids.T, n_probe)
+        order, offsets = self._inverted_lists()
+
+        k = min(k, len(self.ids))
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        result_scores = np.full((len(queries), k), -np.inf)
+        for q, lists in enumerate(probes):
+            candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists])
+            if len(candidates) == 0:
+                continue
+            rows, scores = self._top_k(self.vectors[candidates] @ queries[q], k)
+            result_ids[q, :len(rows)] = self.ids[candidates[rows]]
+            result_scores[q, :len(rows)] = scores
+        return result_ids, result_scores
+
+    def save(self, path):
+        """Persist the index to an .npz file"""
+        np.savez(
+            path,
+            vectors=self.vectors,
+            ids=self.ids,
+            centroids=self.centroids if self.is_trained else np.zeros((0, self.dim), dtype=np.float32),
+            assignments=self.assignments,
+            params=np.array([self.dim, self.n_lists or 0, self.n_probe, self.exact_threshold,
+                             self.kmeans_iterations, self.seed, self._next_id])
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            dim, n_lists, n_probe, exact_threshold, iterations, seed, next_id = data["params"].tolist()
+            index = cls(dim, n_lists or None, n_probe, exact_threshold, iterations, seed)
+            index.vectors = data["vectors"]
+            index.ids = data["ids"]
+            index.assignments = data["assignments"]
+            if len(data["centroids"]):
+                index.centroids = data["centroids"]
+            index._next_id = next_id
+        return index
+
+# Number of pattern banks whose PatternIndex is kept in memory
+PATTERN_INDEX_CACHE_SIZE = 4
+
+_pattern_index_cache = OrderedDict()
+
+def bank_index(target_patterns):
+    """PatternIndex over a bank, ids being its rows, cached per bank content"""
+    key = bank_key(target_patterns)
+    index = _pattern_index_cache.get(key)
+    if index is not None:
+        metrics.increment("pattern_index_cache_hits")
+        _pattern_index_cache.move_to_end(key)
+        return index
+    
+    metrics.increment("pattern_index_cache_misses")
+    target_patterns = np.asarray(target_patterns)
+    index = PatternIndex(target_patterns.shape[1])
+    index.add(target_patterns)
+    _pattern_index_cache[key] = index
+    if len(_pattern_index_cache) > PATTERN_INDEX_CACHE_SIZE:
+        _pattern_index_cache.popitem(last=False)
+    return index
+
+@metrics.timed("search_bank")
+def search_bank(inputs: SearchInputSchema) -> Dict[str, Any]:
+    """Top-k patterns of a bank for each feature vector, through the bank's PatternIndex
+
+    Banks above the index's exact_threshold are clustered and only the
+    n_probe nearest clusters are scored; smaller banks are scored
+    exhaustively, so results match apply_bank.
+    """
+    index = bank_index(inputs.target_patterns)
+    rows, scores = index.search(inputs.feature_vectors, k=inputs.k, n_probe=inputs.n_probe)
+    return {
+        "pattern_rows": rows,
+        "similarity_scores": scores,
+        "is_match": scores > float(inputs.detection_threshold)
+    }
+
+@metrics.timed("apply")
 def apply(inputs: InputSchema) -> Dict[str, Any]:
     """Detect if audio matches target pattern"""
     # Extract from Pydantic model
-    feature_vector = np.array(inputs.feature_vector)
-    target_pattern = np.array(inputs.target_pattern)
+    feature_vector = np.asarray(inputs.feature_vector)
+    target_pattern = np.asarray(inputs.target_pattern)
     threshold = float(inputs.detection_threshold)
     
     # Normalize vectors
@@ -65,14 +456,24 @@ def apply(inputs: InputSchema) -> Dict[str, Any]:
     confidence = float(max(0.0, min(1.0, similarity)))
     
     # Return as dictionary
-    return {
+    result = {
         "is_match": is_match,
         "similarity_score": similarity,
         "confidence": confidence
     }
+    if inputs.feature_vectors is not None:
+        # The whole bank in the same request, with apply_bank's normalized matrix multiply
+        bank_similarity = (normalize_rows(np.asarray(inputs.feature_vectors))
+                           @ normalized_patterns(inputs.target_patterns).T)
+        result["bank_similarity"] = bank_similarity
+        result["bank_is_match"] = bank_similarity > threshold
+    return result
 
+# JSON schemas are generated on first request and then reused; callers must not modify them
+@lru_cache(maxsize=None)
 def schema_input():
     return InputSchema.model_json_schema()
 
+@lru_cache(maxsize=None)
 def schema_output():
     return OutputSchema.model_json_schema()
\ No newline at end of file
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Seeded synthetic training corpora, generated in batches and streamed to disk.
+
+generate_batch() synthesizes n clips of one sound class as a single
+(n, T) float32 array, with the same waveforms as
+train_system.generate_sound. It can optionally jitter each clip's
+frequencies, event length and position, and add white noise at a random
+SNR. Every clip has its own np.random.Generator, seeded from
+SeedSequence(seed, spawn_key=(class index, clip index)). A clip
+therefore comes out the same whatever batch, shard or worker produces
+it.
+
+write_corpus() splits a corpus into shards of `shard_size` clips per
+class. It generates them in a process pool and writes each one as
+<class>-<shard>.npy as soon as it is ready, next to a manifest.json.
+Memory use is bounded by one shard per worker, not by the size of the
+corpus. iter_shards() and load_corpus() read the shards back
+memory-mapped.
+
+    python corpus.py corpus/ --clips 100000 --workers 4 --freq-jitter 0.05 --snr 10 30
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model_store import write_json_atomic
+
+SOUND_CLASSES = ("bird", "motorcycle", "whistle", "noise")
+
+CORPUS_FORMAT = 1
+
+# Clips synthesized together; bounds the float64 temporaries to a few MB per second of audio
+BLOCK_CLIPS = 32
+
+def clip_seeds(seed, sound_type, start, n):
+    """SeedSequences of clips start..start + n - 1 of a class"""
+    if sound_type not in SOUND_CLASSES:
+        raise ValueError("Unknown sound type '%s', expected one of %s" % (sound_type, SOUND_CLASSES))
+    class_index = SOUND_CLASSES.index(sound_type)
+    return [np.random.SeedSequence(seed, spawn_key=(class_index, i)) for i in range(start, start + n)]
+
+def _clip_parameters(rng, samples, freq_jitter, duration_jitter, snr_db):
+    """Per-clip (frequency factor, event length, event offset, SNR in dB or None)"""
+    factor = 1.0 + rng.uniform(-freq_jitter, freq_jitter) if freq_jitter else 1.0
+    length = samples
+    if duration_jitter:
+        length = max(1, int(round(samples * (1.0 - rng.uniform(0.0, duration_jitter)))))
+    offset = int(rng.integers(0, samples - length + 1)) if length < samples else 0
+    snr = float(rng.uniform(snr_db[0], snr_db[1])) if snr_db is not None else None
+    return factor, length, offset, snr
+
+def _synthesize(sound_type, k, dt, factor, length, rngs):
+    """Clean float64 waveforms of a block of clips from their sample positions k (rows, T)"""
+    t = k * dt
+    if sound_type == "bird":
+        # High frequency chirp with on/off quarters, as in generate_sound
+        freq = factor * (3000 + 1000 * np.sin(10 * np.pi * t))
+        signal = np.sin(2 * np.pi * freq * t)
+        quarter = length // 4
+        signal *= (k < quarter) | ((k >= 2 * quarter) & (k < 3 * quarter))
+    elif sound_type == "motorcycle":
+        signal = np.sin(2 * np.pi * 120 * factor * t)
+        signal += 0.5 * np.sin(2 * np.pi * 240 * factor * t)
+        signal += 0.3 * np.sin(2 * np.pi * 360 * factor * t)
+    elif sound_type == "whistle":
+        signal = np.sin(2 * np.pi * 1500 * factor * t)
+    else:
+        signal = 0.5 * np.sin(2 * np.pi * 50 * factor * t)
+        for row, rng in zip(signal, rngs):
+            row += 0.3 * rng.standard_normal(len(row))
+    return signal
+
+def generate_batch(sound_type, n, duration=1, sample_rate=22050, seed=0, start=0,
+                   freq_jitter=0.0, duration_jitter=0.0, snr_db=None, out=None):
+    """(n, T) float32 clips start..start + n - 1 of a sound class
+
+    freq_jitter scales every frequency of a clip by 1 + U(-freq_jitter, freq_jitter).
+    duration_jitter shortens the event by up to that fraction of the clip and
+    places it at a random offset, leaving silence around it. snr_db = (low, high)
+    adds white noise at an SNR drawn uniformly in that range, relative to the
+    event's power. With no jitter and no noise, bird, motorcycle and whistle clips
+    are identical to generate_sound's.
+    """
+    samples = int(sample_rate * duration)
+    if out is None:
+        out = np.empty((n, samples), dtype=np.float32)
+    elif out.shape != (n, samples) or out.dtype != np.float32:
+        raise ValueError("out must be a float32 array of shape %s" % ((n, samples),))
+    if n == 0:
+        return out
+
+    # linspace(0, duration, samples) spacing, so clean clips match generate_sound exactly
+    dt = duration / (samples - 1) if samples > 1 else 0.0
+    positions = np.arange(samples)
+    rngs = [np.random.default_rng(s) for s in clip_seeds(seed, sound_type, start, n)]
+    params = [_clip_parameters(rng, samples, freq_jitter, duration_jitter, snr_db) for rng in rngs]
+
+    for block in range(0, n, BLOCK_CLIPS):
+        block_rngs = rngs[block:block + BLOCK_CLIPS]
+        factor, length, offset, snr = zip(*params[block:block + BLOCK_CLIPS])
+        factor = np.array(factor)[:, None]
+        length = np.array(length)[:, None]
+        offset = np.array(offset)[:, None]
+
+        # Sample index relative to each clip's event start; outside the event is silence
+        k = positions[None, :] - offset
+        active = (k >= 0) & (k < length)
+        signal = _synthesize(sound_type, k, dt, factor, length, block_rngs)
+        signal *= active
+
+        for row, rng, row_snr, row_active in zip(signal, block_rngs, snr, active):
+            if row_snr is None:
+                continue
+            power = np.mean(row[row_active] ** 2) if row_active.any() else 0.0
+            row += np.sqrt(power / 10 ** (row_snr / 10)) * rng.standard_normal(samples)
+        out[block:block + len(block_rngs)] = signal
+    return out
+
+def _shard_name(sound_type, shard):
+    return "%s-%05d.npy" % (sound_type, shard)
+
+def _write_shard(directory, sound_type, shard, start, n, options):
+    """Generate one shard and move it into place; returns its manifest entry"""
+    audio = generate_batch(sound_type, n, start=start, **options)
+    name = _shard_name(sound_type, shard)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".%s." % name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, audio)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {"file": name, "label": sound_type, "start": start, "clips": n}
+
+def write_corpus(directory, clips_per_class, classes=SOUND_CLASSES, shard_size=1024, workers=1,
+                 duration=1, sample_rate=22050, seed=0, freq_jitter=0.0, duration_jitter=0.0,
+                 snr_db=None):
+    """Generate clips_per_class clips of every class into .npy shards; returns the manifest"""
+    os.makedirs(directory, exist_ok=True)
+    options = {
+        "duration": duration,
+        "sample_rate": sample_rate,
+        "seed": seed,
+        "freq_jitter": freq_jitter,
+        "duration_jitter": duration_jitter,
+        "snr_db": list(snr_db) if snr_db is not None else None
+    }
+    tasks = [(sound_type, shard, start, min(shard_size, clips_per_class - start))
+             for sound_type in classes
+             for shard, start in enumerate(range(0, clips_per_class, shard_size))]
+
+    if workers <= 1:
+        shards = [_write_shard(directory, *task, options) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_write_shard, directory, *task, options) for task in tasks]
+            shards = [future.result() for future in futures]
+
+    manifest = dict(options, format=CORPUS_FORMAT, classes=list(classes),
+                    clips_per_class=clips_per_class, shards=shards)
+    write_json_atomic(os.path.join(directory, "manifest.json"), manifest, indent=2)
+    return manifest
+
+def read_manifest(directory):
+    with open(os.path.join(directory, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != CORPUS_FORMAT:
+        raise ValueError("Unsupported corpus format %r in %s" % (manifest.get("format"), directory))
+    return manifest
+
+def iter_shards(directory):
+    """Yield (memory-mapped (n, T) float32 clips, label) per shard"""
+    for shard in read_manifest(directory)["shards"]:
+        yield np.load(os.path.join(directory, shard["file"]), mmap_mode="r"), shard["label"]
+
+def load_corpus(directory, max_clips_per_class=None):
+    """All clips of a corpus as one (N, T) float32 array plus their labels"""
+    parts = []
+    labels = []
+    taken = {}
+    for audio, label in iter_shards(directory):
+        if max_clips_per_class is not None:
+            audio = audio[:max(0, max_clips_per_class - taken.get(label, 0))]
+        taken[label] = taken.get(label, 0) + len(audio)
+        parts.append(audio)
+        labels.extend([label] * len(audio))
+    return np.concatenate(parts) if parts else np.empty((0, 0), dtype=np.float32), labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Sound Hunter corpus as .npy shards")
+    parser.add_argument("directory")
+    parser.add_argument("--clips", type=int, default=1000, help="clips per class")
+    parser.add_argument("--classes", nargs="+", default=list(SOUND_CLASSES), choices=SOUND_CLASSES)
+    parser.add_argument("--shard-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SOUND_HUNTER_WORKERS", "1")))
+    parser.add_argument("--duration", type=float, default=1.0, help="clip length in seconds")
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--freq-jitter", type=float, default=0.0, help="relative frequency jitter")
+    parser.add_argument("--duration-jitter", type=float, default=0.0,
+                        help="largest fraction by which an event is shortened")
+    parser.add_argument("--snr", type=float, nargs=2, metavar=("LOW", "HIGH"),
+                        help="add white noise at an SNR drawn from [LOW, HIGH] dB")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = write_corpus(args.directory, args.clips, args.classes, args.shard_size, args.workers,
+                            args.duration, args.sample_rate, args.seed, args.freq_jitter,
+                            args.duration_jitter, args.snr)
+    elapsed = time.perf_counter() - start
+    clips = args.clips * len(args.classes)
+    print("Wrote %d clips in %d shards to %s in %.1f s (%.0f clips/s)" % (
+        clips, len(manifest["shards"]), args.directory, elapsed, clips / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""On-disk cache of clip spectra keyed by content hash.
+
+Each clip's rfft is stored once as <key>.npy, where the key hashes the
+samples, their dtype and the sample rate, so the same clip reused
+across epochs, targets and runs is transformed only once. Entries are
+evicted least-recently-used first when the cache grows past max_bytes;
+recency survives restarts through file modification times.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+class SpectralCorpusCache:
+    """Content-addressed, size-capped LRU store of rfft spectra"""
+
+    def __init__(self, path=".spectral_cache", max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+        # Rebuild LRU order from the files already on disk, oldest first
+        entries = []
+        for name in os.listdir(path):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(path, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.total_bytes = sum(self._entries.values())
+
+    @staticmethod
+    def key(audio, sample_rate):
+        """Content hash of a clip's samples, dtype and sample rate"""
+        audio = np.ascontiguousarray(audio)
+        digest = hashlib.blake2b(audio.tobytes(), digest_size=20)
+        digest.update(("%s:%d" % (audio.dtype.str, sample_rate)).encode())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".npy")
+
+    def rfft(self, audio, sample_rate):
+        """The clip's rfft, memory-mapped from the cache or computed and stored"""
+        key = self.key(audio, sample_rate)
+        if key in self._entries:
+            try:
+                spectrum = np.load(self._file(key), mmap_mode="r")
+            except (OSError, ValueError):
+                # Evicted or corrupted behind our back; recompute below
+                self._forget(key)
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                os.utime(self._file(key))
+                return spectrum
+
+        self.misses += 1
+        spectrum = np.fft.rfft(audio)
+        self._store(key, spectrum)
+        return spectrum
+
+    def rfft_batch(self, audio_batch, sample_rate):
+        """rfft of every row of an (N, T) batch, reading through the cache"""
+        return np.stack([self.rfft(audio, sample_rate) for audio in audio_batch])
+
+    def _store(self, key, spectrum):
+        # A private temporary file per writer, so processes sharing the cache never
+        # write into each other's half-finished entry; the last replace wins
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".%s." % key, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, spectrum)
+                size = f.tell()
+            os.replace(tmp_path, self._file(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._forget(key)
+        self._entries[key] = size
+        self.total_bytes += size
+        self._evict()
+
+    def _forget(self, key):
+        self.total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._forget(key)
+            try:
+                os.unlink(self._file(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for key in list(self._entries):
+            self._forget(key)
+            try:
+                os.unlink(self._file(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -2,6 +2,7 @@
 
 import tesseract_core
 import numpy as np
+import array_transport
 import json
 
 # Generate test data
@@ -13,8 +14,8 @@ print("Testing jacobian call...")
 
 with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter:
     # First, let's see what the apply method returns
-    apply_result = audio_filter.apply({
-        "audio_data": test_audio.tolist(),
+    apply_result = array_transport.apply(audio_filter, {
+        "audio_data": test_audio,
         "sample_rate": sample_rate,
         "filter_params": {"low_freq": 400, "high_freq": 500}
     })
@@ -28,7 +29,7 @@ with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter:
         print("\n1. Standard call:")
         result = audio_filter.jacobian(
             {
-                "audio_data": test_audio.tolist(),
+                "audio_data": test_audio,
                 "sample_rate": sample_rate,
                 "filter_params": {"low_freq": 400, "high_freq": 500}
             },
@@ -44,7 +45,7 @@ with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter:
         print("\n2. Parent field only:")
         result = audio_filter.jacobian(
             {
-                "audio_data": test_audio.tolist(),
+                "audio_data": test_audio,
                 "sample_rate": sample_rate,
                 "filter_params": {"low_freq": 400, "high_freq": 500}
             },
@@ -60,7 +61,7 @@ with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter:
         print("\n3. Audio data gradient:")
         result = audio_filter.jacobian(
             {
-                "audio_data": test_audio.tolist(),
+                "audio_data": test_audio,
                 "sample_rate": sample_rate,
                 "filter_params": {"low_freq": 400, "high_freq": 500}
             },
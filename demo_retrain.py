@@ -1,9 +1,9 @@
-import tesseract_core
 import numpy as np
-import json
+from pipeline import SoundHunterPipeline
+from model_store import load_models
 
-def test_detection(sound_type, model):
-    """Test detection on a new sound"""
+def test_detection(sound_type, models, pipeline):
+    """Test every detector on a new sound"""
     # Generate test sound
     t = np.linspace(0, 1, 22050)
     
@@ -16,36 +16,15 @@ def test_detection(sound_type, model):
     else:
         test_audio = 0.3 * np.random.randn(len(t))
     
-    # Run through pipeline using context managers
-    with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter:
-        filter_result = audio_filter.apply({
-            "audio_data": test_audio.tolist(),
-            "sample_rate": 22050,
-            "filter_params": model["filter_params"]
-        })
-    
-    with tesseract_core.Tesseract.from_image("feature-extractor:latest") as feature_extractor:
-        feature_result = feature_extractor.apply({
-            "filtered_audio": filter_result["filtered_audio"],
-            "sample_rate": filter_result["sample_rate"]
-        })
-    
-    with tesseract_core.Tesseract.from_image("pattern-detector:latest") as pattern_detector:
-        detection_result = pattern_detector.apply({
-            "feature_vector": feature_result["feature_vector"],
-            "target_pattern": model["target_pattern"],
-            "detection_threshold": 0.7
-        })
-    
-    return detection_result["is_match"], detection_result["confidence"]
+    # Score the clip against all detectors in one pass through the shared pipeline
+    return pipeline.detect_all(test_audio, 22050, models, detection_threshold=0.7)
 
 def main():
     print("=== Demonstrating Retraining Capability ===\n")
     
     # Load trained models
     try:
-        with open("trained_models.json", "r") as f:
-            models = json.load(f)
+        models = load_models()
     except:
         print("ERROR: Run train_system.py first to create models!")
         return
@@ -58,12 +37,16 @@ def main():
     print("%-15s %-15s %-12s %-10s" % ("Detector", "Test Sound", "Detection", "Confidence"))
     print("-" * 60)
     
+    with SoundHunterPipeline() as pipeline:
+        results = {test_sound: test_detection(test_sound, models, pipeline)
+                   for test_sound in test_sounds}
+    
     for detector_name, model in models.items():
         print("\n%s DETECTOR (Filter: %.0f-%.0f Hz)" % 
               (detector_name.upper(), model['filter_params']['low_freq'], model['filter_params']['high_freq']))
         
         for test_sound in test_sounds:
-            is_match, confidence = test_detection(test_sound, model)
+            is_match, confidence = results[test_sound][detector_name]
             status = "  DETECTED" if is_match else "   Rejected"
             print("%-15s %-15s %-12s %.1f%%" % ("  ", test_sound, status, confidence * 100))
     
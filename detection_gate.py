@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Cheap pre-gate in front of feature extraction and pattern matching.
+
+For each window, audio-filter's band energy for every loaded model
+(SoundHunterPipeline.band_energies) is compared with an adaptive noise
+floor per model. The window passes on to the rest of the pipeline only
+if some model's band energy rises `margin` times above its floor, or if
+the window's peak frequency falls inside a model's band whose energy is
+at least sqrt(margin) times its floor.
+
+The floor follows quiet windows only, so events do not raise it; a
+lasting rise in background level therefore keeps the gate open (it
+fails towards processing rather than towards missed detections). Two
+floor estimators are available: an exponential moving average of log
+energy ("ema") and a running percentile, the median by default, of
+recent quiet windows ("percentile").
+"""
+
+from collections import deque
+
+import numpy as np
+
+FLOOR_MODES = ("ema", "percentile")
+
+class DetectionGate:
+    """Decide per window whether any model's band rises above its noise floor"""
+
+    def __init__(self, models, mode="ema", margin=4.0, alpha=0.05, percentile=50.0,
+                 history=200, warmup=8, min_energy=1e-10):
+        if mode not in FLOOR_MODES:
+            raise ValueError("Unknown floor mode '%s', expected one of %s" % (mode, FLOOR_MODES))
+        self.names = list(models)
+        self.bands = np.array([[models[name]["filter_params"]["low_freq"],
+                                models[name]["filter_params"]["high_freq"]] for name in self.names])
+        self.mode = mode
+        self.margin = margin
+        self.alpha = alpha
+        self.percentile = percentile
+        self.warmup = warmup
+        self.min_energy = min_energy
+
+        self._log_floor = None
+        self._quiet_history = deque(maxlen=history)
+        self.windows_seen = 0
+        self.stats = {"windows_gated": 0, "windows_processed": 0}
+
+    @property
+    def noise_floor(self):
+        """Current per-model noise floor energies, or None before the first window"""
+        if self._log_floor is None:
+            return None
+        return np.exp(self._log_floor)
+
+    def _update_floor(self, log_energy):
+        if self._log_floor is None:
+            self._log_floor = log_energy.copy()
+        elif self.mode == "ema":
+            self._log_floor += self.alpha * (log_energy - self._log_floor)
+        else:
+            self._quiet_history.append(log_energy)
+            self._log_floor = np.percentile(np.array(self._quiet_history), self.percentile, axis=0)
+
+    def update(self, energies, peak_frequency):
+        """Feed one window's band energies (M,) and peak frequency; True if it should be processed"""
+        log_energy = np.log(np.maximum(np.asarray(energies, dtype=np.float64), self.min_energy))
+        self.windows_seen += 1
+
+        # Establish the floor on the first windows, processing them regardless
+        if self.windows_seen <= self.warmup or self._log_floor is None:
+            self._update_floor(log_energy)
+            self.stats["windows_processed"] += 1
+            return True
+
+        rise = log_energy - self._log_floor
+        loud = rise > np.log(self.margin)
+        in_band = (self.bands[:, 0] <= peak_frequency) & (peak_frequency <= self.bands[:, 1])
+        is_open = bool(np.any(loud | (in_band & (rise > 0.5 * np.log(self.margin)))))
+
+        if is_open:
+            self.stats["windows_processed"] += 1
+        else:
+            self.stats["windows_gated"] += 1
+            self._update_floor(log_energy)
+        return is_open
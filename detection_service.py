@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Continuous sliding-window detection over PCM audio streams.
+
+Chunks of samples are pushed into a bounded asyncio queue (feed() waits
+while it is full, so a socket or file reader slows down instead of
+buffering without limit). A consumer copies them into a ring buffer and,
+every `hop` seconds of audio, scores the latest `window` seconds against
+every loaded model with SoundHunterPipeline.detect_all. Matches are
+emitted as timestamped events.
+
+An optional DetectionGate (detection_gate.py) runs audio-filter's band
+energies first and skips feature extraction and matching for windows
+that stay under every model's noise floor.
+
+Every complete window is scored, however large the chunks are. Each
+stage has a latency budget and overruns are counted. With `max_lag` set,
+the consumer also watches how far behind the live stream it is: once the
+newest buffered sample has waited longer than `max_lag` seconds, the
+unscored windows before the newest one are dropped and counted as
+skipped. Offline replays leave `max_lag` unset and never skip.
+
+Sources: raw 16-bit little-endian mono PCM over TCP (serve_tcp) or a
+growing raw PCM file (tail_file). For offline replay see
+benchmarks/replay_wav.py.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from pipeline import SoundHunterPipeline
+from model_store import load_models
+from detection_gate import DetectionGate, FLOOR_MODES
+import metrics
+
+PCM_DTYPE = np.dtype("<i2")
+
+STAGES = ("gate", "filter", "features", "detect")
+
+# Latency samples kept for percentile reporting
+LATENCY_HISTORY = 10000
+
+def pcm_to_float(data):
+    """16-bit little-endian PCM bytes to float32 samples in [-1, 1)"""
+    return np.frombuffer(data, dtype=PCM_DTYPE).astype(np.float32) / 32768.0
+
+def latency_percentiles(values, percentiles=(50, 90, 99)):
+    """{percentile: value} of a sequence of latencies (empty dict if there are none)"""
+    if not len(values):
+        return {}
+    return dict(zip(percentiles, np.percentile(np.asarray(values), percentiles)))
+
+class RingBuffer:
+    """Most recent `capacity` samples of a stream, addressed by absolute sample position"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self.total = 0
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) >= self.capacity:
+            # Only the last capacity samples survive; sample i lives at i % capacity
+            end = self.total + len(samples)
+            self._data[np.arange(end - self.capacity, end) % self.capacity] = samples[-self.capacity:]
+        else:
+            start = self.total % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self._data[start:start + first] = samples[:first]
+            self._data[:len(samples) - first] = samples[first:]
+        self.total += len(samples)
+
+    def read(self, start, end):
+        """Copy of samples [start, end) of the stream; they must still be in the buffer"""
+        if start < self.total - self.capacity or end > self.total or start > end:
+            raise ValueError("Samples %d-%d are not in the buffer (holds %d-%d)" % (
+                start, end, max(self.total - self.capacity, 0), self.total))
+        indices = np.arange(start, end) % self.capacity
+        return self._data[indices]
+
+class DetectionService:
+    """Score hopped windows of an audio stream against every model and emit detection events"""
+
+    def __init__(self, models, sample_rate=22050, window=1.0, hop=0.25, detection_threshold=0.8,
+                 queue_size=16, latency_budget=None, backend="inprocess", on_event=None, gate=None,
+                 max_lag=None):
+        self.models = models
+        self.sample_rate = sample_rate
+        self.window_samples = int(round(window * sample_rate))
+        self.hop_samples = int(round(hop * sample_rate))
+        self.detection_threshold = detection_threshold
+        self.on_event = on_event
+        self.gate = gate
+
+        # Seconds each stage may take per window; by default an equal share of the hop
+        if latency_budget is None:
+            latency_budget = {stage: hop / len(STAGES) for stage in STAGES}
+        self.latency_budget = dict(latency_budget)
+        # Seconds the newest sample may wait before stale windows are dropped (None: never drop)
+        self.max_lag = max_lag
+
+        self.pipeline = SoundHunterPipeline(backend)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.ring = RingBuffer(2 * self.window_samples + self.hop_samples)
+        self._next_window_end = self.window_samples
+        self._stream_origin = None
+
+        self.events = deque(maxlen=LATENCY_HISTORY)
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.stage_latencies = {stage: deque(maxlen=LATENCY_HISTORY) for stage in STAGES}
+        self.stats = {
+            "chunks": 0,
+            "samples": 0,
+            "windows_processed": 0,
+            "windows_gated": 0,
+            "windows_skipped": 0,
+            "events": 0,
+            "budget_overruns": {stage: 0 for stage in STAGES}
+        }
+
+    async def feed(self, samples):
+        """Queue a chunk of float samples, waiting while the queue is full"""
+        await self.queue.put((np.asarray(samples, dtype=np.float32), time.perf_counter()))
+
+    async def end_of_stream(self):
+        await self.queue.put(None)
+
+    async def run(self):
+        """Consume queued chunks until end_of_stream(); returns the stats"""
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                break
+            chunk, arrival = item
+            if self._stream_origin is None:
+                self._stream_origin = time.time()
+            self.stats["chunks"] += 1
+            self.stats["samples"] += len(chunk)
+            if self._is_late(arrival):
+                # Only the newest window will be scored, so older samples may be overwritten
+                self.ring.write(chunk)
+                await self._score_pending(arrival)
+                continue
+            # Write at most a hop at a time so no unscored window is overwritten in the ring
+            for offset in range(0, len(chunk), self.hop_samples):
+                self.ring.write(chunk[offset:offset + self.hop_samples])
+                await self._score_pending(arrival)
+        return self.stats
+
+    def _is_late(self, arrival):
+        """Whether the newest buffered sample has waited longer than max_lag"""
+        return self.max_lag is not None and time.perf_counter() - arrival > self.max_lag
+
+    async def _score_pending(self, arrival):
+        """Score every complete window in the ring, dropping stale ones only when late"""
+        while self.ring.total >= self._next_window_end:
+            if self._is_late(arrival):
+                stale = (self.ring.total - self._next_window_end) // self.hop_samples
+                self.stats["windows_skipped"] += stale
+                self._next_window_end += stale * self.hop_samples
+            end = self._next_window_end
+            self._next_window_end += self.hop_samples
+
+            window = self.ring.read(end - self.window_samples, end)
+            # CPU-bound scoring runs in a worker thread so ingestion keeps going
+            await asyncio.to_thread(self._score_window, window, end, arrival)
+
+    def _score_window(self, window, end, arrival):
+        timings = {}
+        results = {}
+        is_open = True
+        if self.gate is not None:
+            start = time.perf_counter()
+            energies, peak_frequency = self.pipeline.band_energies(window, self.sample_rate, self.models)
+            is_open = self.gate.update(energies, peak_frequency)
+            timings["gate"] = time.perf_counter() - start
+        if is_open:
+            results = self.pipeline.detect_all(window, self.sample_rate, self.models,
+                                               self.detection_threshold, timings=timings)
+            self.stats["windows_processed"] += 1
+        else:
+            self.stats["windows_gated"] += 1
+        latency = time.perf_counter() - arrival
+        self.latencies.append(latency)
+        # Stages that did not run for this window (no gate, or gated) are not recorded
+        for stage, seconds in timings.items():
+            self.stage_latencies[stage].append(seconds)
+            if seconds > self.latency_budget[stage]:
+                self.stats["budget_overruns"][stage] += 1
+
+        stream_time = (end - self.window_samples) / self.sample_rate
+        for name, (is_match, confidence) in results.items():
+            if not is_match:
+                continue
+            event = {
+                "model": name,
+                "confidence": confidence,
+                "stream_time": stream_time,
+                "timestamp": self._stream_origin + stream_time,
+                "latency": latency
+            }
+            self.events.append(event)
+            self.stats["events"] += 1
+            if self.on_event is not None:
+                self.on_event(event)
+
+    def report(self):
+        """Stats plus end-to-end and per-stage latency percentiles, in seconds"""
+        return dict(self.stats, **{
+            "latency": latency_percentiles(self.latencies),
+            "stage_latency": {stage: latency_percentiles(values)
+                              for stage, values in self.stage_latencies.items()}
+        })
+
+    def close(self):
+        self.pipeline.close()
+
+async def serve_tcp(service, host="127.0.0.1", port=9000, chunk_bytes=4096):
+    """Accept one PCM stream at a time over TCP and feed it to the service"""
+    async def handle(reader, writer):
+        remainder = b""
+        while True:
+            data = await reader.read(chunk_bytes)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % PCM_DTYPE.itemsize
+            remainder = data[usable:]
+            # feed() blocks while the queue is full, which stops us reading the socket
+            await service.feed(pcm_to_float(data[:usable]))
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+async def tail_file(service, path, chunk_bytes=8192, poll_interval=0.05, follow=True):
+    """Feed a raw PCM file to the service, following it as it grows when follow is set"""
+    with open(path, "rb") as f:
+        remainder = b""
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                if not follow:
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+            data = remainder + data
+            usable = len(data) - len(data) % PCM_DTYPE.itemsize
+            remainder = data[usable:]
+            await service.feed(pcm_to_float(data[:usable]))
+    await service.end_of_stream()
+
+def print_event(event):
+    print("%s  %-12s %5.1f%%  (stream %.2f s, latency %.1f ms)" % (
+        time.strftime("%H:%M:%S", time.localtime(event["timestamp"])), event["model"],
+        event["confidence"] * 100, event["stream_time"], event["latency"] * 1000))
+
+async def serve(args):
+    models = load_models()
+    gate = DetectionGate(models, mode=args.gate) if args.gate else None
+    service = DetectionService(models, args.sample_rate, args.window, args.hop, args.threshold,
+                               backend=args.backend, on_event=print_event, gate=gate,
+                               max_lag=args.max_lag)
+    consumer = asyncio.create_task(service.run())
+    try:
+        if args.tail:
+            await tail_file(service, args.tail, follow=not args.no_follow)
+            await consumer
+        else:
+            print("Listening for 16-bit PCM on %s:%d" % (args.host, args.port))
+            await asyncio.gather(serve_tcp(service, args.host, args.port), consumer)
+    finally:
+        service.close()
+    return service
+
+def main():
+    parser = argparse.ArgumentParser(description="Sound Hunter streaming detection service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--tail", help="raw 16-bit PCM file to read (and follow) instead of a socket")
+    parser.add_argument("--no-follow", action="store_true", help="stop at the end of the --tail file")
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--window", type=float, default=1.0, help="window length in seconds")
+    parser.add_argument("--hop", type=float, default=0.25, help="hop between windows in seconds")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--backend", default=os.environ.get("SOUND_HUNTER_BACKEND", "inprocess"))
+    parser.add_argument("--max-lag", type=float, default=2.0,
+                        help="seconds behind the stream before stale windows are skipped")
+    parser.add_argument("--gate", choices=FLOOR_MODES,
+                        help="skip windows below an adaptive noise floor (ema or percentile)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="enable metrics and serve /metrics and /metrics.json on this port")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port, args.host)
+
+    service = asyncio.run(serve(args))
+    report = service.report()
+    print("\nWindows processed: %d, gated: %d, skipped: %d, events: %d" % (
+        report["windows_processed"], report["windows_gated"], report["windows_skipped"], report["events"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""In-memory metrics for the pipeline, the training loop and the components.
+
+The Metrics class lives in component_support.py, which is also copied
+into every component image. Each component's tesseract_api module keeps
+a module-level `metrics` instance of it; the scripts register theirs here
+with get_metrics(). Inside the containers the components record metrics
+too, but nothing exports them: only the in-process components are
+collected.
+Everything is off unless SOUND_HUNTER_METRICS=1 or enable() is called.
+
+Export:
+
+    collect()         snapshots of every registry, plus in-process components
+    to_prometheus()   Prometheus text exposition format
+    to_json()         the same as JSON
+    serve(port)       /metrics and /metrics.json over HTTP in a daemon thread
+
+For profiles, wrap a section in profiled(name): with SOUND_HUNTER_PROFILE
+set to a directory, it writes <name>-<pid>.prof there for pstats or
+snakeviz. Sampling profilers such as `py-spy record -- python
+train_system.py` need no hook at all.
+"""
+
+import contextlib
+import cProfile
+import copy
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import component_support
+from component_support import Metrics
+
+# Mirrors component_support.METRICS_ENABLED; enable() keeps the two in step
+METRICS_ENABLED = component_support.METRICS_ENABLED
+
+_registries = {}
+
+def get_metrics(component):
+    """The Metrics registry of a script-side component, created on first use"""
+    metrics = _registries.get(component)
+    if metrics is None:
+        metrics = _registries[component] = Metrics(component)
+    return metrics
+
+def _component_metrics():
+    # pipeline imports this module, so look it up lazily
+    import pipeline
+    return [module.metrics for module in pipeline._loaded_components.values() if hasattr(module, "metrics")]
+
+def enable(flag=True):
+    """Switch recording on or off for every registry and loaded component"""
+    global METRICS_ENABLED
+    METRICS_ENABLED = component_support.METRICS_ENABLED = flag
+    for metrics in list(_registries.values()) + _component_metrics():
+        metrics.enabled = flag
+
+def reset():
+    for metrics in list(_registries.values()) + _component_metrics():
+        metrics.reset()
+
+def collect():
+    """Snapshots of all registries, scripts first, then in-process components"""
+    return [metrics.snapshot() for metrics in list(_registries.values()) + _component_metrics()]
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _metric_name(name):
+    return "sound_hunter_" + "".join(c if c.isalnum() else "_" for c in name)
+
+def to_prometheus(snapshots=None):
+    """Prometheus text format: histograms as _bucket/_sum/_count, counters as _total"""
+    lines = []
+    for snapshot in collect() if snapshots is None else snapshots:
+        label = 'component="%s"' % snapshot["component"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("%s_total{%s} %s" % (_metric_name(name), label, _format_value(value)))
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append("%s{%s} %s" % (_metric_name(name), label, _format_value(value)))
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            # Latency histograms are in seconds, the others in bytes
+            metric = _metric_name(name) + ("" if name.endswith("bytes") else "_seconds")
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (metric, label, _format_value(bound), cumulative))
+            lines.append("%s_sum{%s} %s" % (metric, label, _format_value(histogram["sum"])))
+            lines.append("%s_count{%s} %d" % (metric, label, histogram["count"]))
+    return "\n".join(lines) + "\n"
+
+def to_json(snapshots=None, indent=None):
+    """Snapshots as JSON, with the infinite bucket bound written as the string +Inf"""
+    # Rewrite the bounds of a copy, never the caller's snapshots
+    snapshots = collect() if snapshots is None else copy.deepcopy(snapshots)
+    for snapshot in snapshots:
+        for histogram in snapshot["histograms"].values():
+            histogram["buckets"] = [_format_value(bound) if bound == float("inf") else bound
+                                    for bound in histogram["buckets"]]
+    return json.dumps(snapshots, indent=indent, sort_keys=True)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port=9100, host="127.0.0.1"):
+    """Enable metrics and serve them over HTTP from a daemon thread; returns the server"""
+    enable(True)
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+@contextlib.contextmanager
+def profiled(name):
+    """cProfile the block into $SOUND_HUNTER_PROFILE/<name>-<pid>.prof when that is set"""
+    directory = os.environ.get("SOUND_HUNTER_PROFILE")
+    if not directory:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(os.path.join(directory, "%s-%d.prof" % (name, os.getpid())))
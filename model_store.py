@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compact binary store for trained detectors.
+
+A store is a directory with two files:
+
+    index.json    small header: pattern width, store version and one entry
+                  per saved model version (name, filter band, pattern row)
+    patterns.f32  every target pattern ever saved, as little-endian float32
+                  rows, append-only
+
+Saving a model appends its pattern row and then atomically replaces the
+header, so readers always see a consistent store. Older versions stay
+addressable by row. Patterns are read lazily through a single np.memmap.
+"""
+
+import json
+import os
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+PATTERN_DTYPE = np.dtype("<f4")
+
+STORE_FORMAT = 1
+
+def write_json_atomic(path, data, indent=None):
+    """Write JSON to a temporary file next to path, then move it into place"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".%s." % os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+        # mkstemp creates the file owner-only; keep the permissions of the file we replace
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class ModelStore(Mapping):
+    """name -> model dict (filter_params, target_pattern, sound_type, features), backed by a store directory"""
+
+    def __init__(self, path="models"):
+        self.path = path
+        self.index_path = os.path.join(path, "index.json")
+        self.patterns_path = os.path.join(path, "patterns.f32")
+        self._patterns = None
+        self._load_header()
+
+    def _load_header(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.header = json.load(f)
+        else:
+            self.header = {"format": STORE_FORMAT, "version": 0, "dim": None, "rows": 0, "entries": []}
+        # Latest entry per name
+        self._current = {}
+        for entry in self.header["entries"]:
+            self._current[entry["name"]] = entry
+        self._patterns = None
+
+    @property
+    def version(self):
+        return self.header["version"]
+
+    @property
+    def patterns(self):
+        """Memory-mapped (rows, dim) matrix of every pattern in the store"""
+        if self._patterns is None and self.header["rows"]:
+            self._patterns = np.memmap(self.patterns_path, dtype=PATTERN_DTYPE, mode="r",
+                                       shape=(self.header["rows"], self.header["dim"]))
+        return self._patterns
+
+    def __getitem__(self, name):
+        entry = self._current[name]
+        return {
+            "filter_params": dict(entry["filter_params"]),
+            "target_pattern": self.patterns[entry["row"]],
+            "sound_type": entry["sound_type"],
+            "features": entry.get("features", "framed")
+        }
+
+    def __iter__(self):
+        return iter(self._current)
+
+    def __len__(self):
+        return len(self._current)
+
+    def pattern_matrix(self, names=None):
+        """Current target patterns of the named models (all by default), one row each"""
+        names = list(self._current) if names is None else list(names)
+        rows = [self._current[name]["row"] for name in names]
+        return np.asarray(self.patterns[rows])
+
+    def history(self, name):
+        """Every saved version of a model, oldest first"""
+        return [
+            {
+                "version": entry["version"],
+                "filter_params": dict(entry["filter_params"]),
+                "target_pattern": self.patterns[entry["row"]],
+                "sound_type": entry["sound_type"],
+                "features": entry.get("features", "framed")
+            }
+            for entry in self.header["entries"] if entry["name"] == name
+        ]
+
+    def save(self, models):
+        """Append new versions of the given models and publish them atomically"""
+        if not models:
+            return self.version
+        names = list(models)
+        matrix = np.asarray([models[name]["target_pattern"] for name in names], dtype=PATTERN_DTYPE)
+        dim = self.header["dim"]
+        if dim is None:
+            dim = matrix.shape[1]
+        elif matrix.shape[1] != dim:
+            raise ValueError("Store holds %d-dim patterns, got %d-dim" % (dim, matrix.shape[1]))
+
+        os.makedirs(self.path, exist_ok=True)
+
+        # Data first: rows past the header's row count are invisible to readers
+        first_row = self.header["rows"]
+        with open(self.patterns_path, "ab") as f:
+            f.truncate(first_row * dim * PATTERN_DTYPE.itemsize)
+            f.write(np.ascontiguousarray(matrix).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        header = dict(self.header)
+        header["dim"] = dim
+        header["version"] = self.version + 1
+        header["rows"] = first_row + len(names)
+        header["entries"] = list(self.header["entries"]) + [
+            {
+                "name": name,
+                "row": first_row + i,
+                "version": header["version"],
+                "filter_params": {key: float(value) for key, value in models[name]["filter_params"].items()},
+                "sound_type": models[name].get("sound_type", name),
+                "features": models[name].get("features", "framed")
+            }
+            for i, name in enumerate(names)
+        ]
+        write_json_atomic(self.index_path, header)
+        self._load_header()
+        return self.version
+
+    def to_json_models(self):
+        """Current models in the trained_models.json format"""
+        return {
+            name: {
+                "filter_params": model["filter_params"],
+                "target_pattern": np.asarray(model["target_pattern"]).tolist(),
+                "sound_type": model["sound_type"],
+                "features": model["features"]
+            }
+            for name, model in self.items()
+        }
+
+    def export_json(self, path="trained_models.json"):
+        """Write the current models as a trained_models.json file"""
+        write_json_atomic(path, self.to_json_models(), indent=2)
+
+    def import_json(self, path="trained_models.json"):
+        """Save every model of a trained_models.json file as a new store version"""
+        with open(path, "r") as f:
+            return self.save(json.load(f))
+
+def load_models(store_path="models", json_path="trained_models.json"):
+    """Open the model store if there is one, else fall back to the JSON model file"""
+    store = ModelStore(store_path)
+    if len(store):
+        return store
+    with open(json_path, "r") as f:
+        return json.load(f)
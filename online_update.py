@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Incremental detector updates from new labeled clips, without retraining.
+
+Each detector keeps running sufficient statistics next to the model
+store, in <store>/stats/<name>.npz:
+
+    per class   weight and mean Parseval power spectrum on a fixed
+                frequency grid (bin_hz wide bins up to Nyquist)
+    pattern     weight, mean and M2 (Welford) of the feature vectors of
+                the target clips, each taken at the band in force when
+                the clip arrived
+
+BandTrainer's energy_ratio objective only depends on the mean power
+spectrum of the target clips and of all other clips, so the objective
+fitted from the class means is the same as when training on every clip
+seen so far. The resulting band need not be: the fit is non-convex and
+an update starts from the current band, so it may settle on a different
+optimum than a retrain (benchmarks/check_online_update.py compares their
+energy ratios). update_model() costs one FFT and one feature pass per
+new clip, plus a band fit whose size does not grow with the history.
+
+With forgetting < 1, every new clip of a class multiplies the weight of
+that class's (and, for target clips, the pattern's) earlier clips by
+forgetting, so the model tracks a drifting environment with an effective
+memory of about 1 / (1 - forgetting) clips per class.
+
+    python online_update.py whistle --clips 5 --freq-jitter 0.05 --forgetting 0.98
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from corpus import SOUND_CLASSES, generate_batch
+from model_store import ModelStore
+from pipeline import SoundHunterPipeline, feature_mode, load_component
+from trainer import BandTrainer
+
+STATS_FORMAT = 1
+
+# Width of the frequency bins the class spectra are accumulated on; 1 Hz matches
+# the rfft grid of 1 s clips, so their statistics are exact
+STATS_BIN_HZ = 1.0
+
+# Clips transformed at a time when recording statistics for a whole corpus
+STATS_CHUNK = 256
+
+def _merge(weight, mean, m2, samples, forgetting):
+    """Fold (k, D) samples into a running weighted (weight, mean, M2)
+
+    The newest sample has weight 1 and every earlier one, including the
+    running state, counts forgetting times less than the one after it.
+    Batches are combined with the weighted form of Chan's parallel
+    Welford update; m2=None skips the second moment.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    k = len(samples)
+    if k == 0:
+        return weight, mean, m2
+    sample_weights = forgetting ** np.arange(k - 1, -1, -1, dtype=np.float64)
+    batch_weight = sample_weights.sum()
+    batch_mean = sample_weights @ samples / batch_weight
+
+    old_weight = weight * forgetting ** k
+    total = old_weight + batch_weight
+    delta = batch_mean - mean
+    mean = mean + delta * (batch_weight / total)
+    if m2 is not None:
+        centered = samples - batch_mean
+        m2 = (m2 * forgetting ** k + sample_weights @ (centered * centered)
+              + delta * delta * (old_weight * batch_weight / total))
+    return total, mean, m2
+
+def binned_power(audio_samples, sample_rate=22050, bin_hz=STATS_BIN_HZ, spectrum_cache=None):
+    """(N, F) Parseval power of every clip, summed into bin_hz wide bins up to Nyquist
+
+    Clips may differ in length; each keeps its total energy.
+    """
+    audio_filter = load_component("audio_filter")
+    n_bins = int(sample_rate / 2 / bin_hz) + 1
+    clips = [np.asarray(audio, dtype=np.float32) for audio in audio_samples]
+    binned = np.zeros((len(clips), n_bins))
+
+    # One batched transform per distinct clip length
+    by_length = {}
+    for i, audio in enumerate(clips):
+        by_length.setdefault(len(audio), []).append(i)
+    for n, rows in by_length.items():
+        batch = np.stack([clips[i] for i in rows])
+        if spectrum_cache is not None:
+            fft = spectrum_cache.rfft_batch(batch, sample_rate)
+        else:
+            fft = np.fft.rfft(batch, axis=1)
+        power = audio_filter.parseval_power(fft, n)
+
+        columns = np.minimum(np.rint(np.fft.rfftfreq(n, 1/sample_rate) / bin_hz).astype(int), n_bins - 1)
+        if len(columns) == n_bins and np.array_equal(columns, np.arange(n_bins)):
+            binned[rows] = power
+            continue
+        # columns is non-decreasing: sum each run of rfft bins that lands in the same grid bin
+        targets, starts = np.unique(columns, return_index=True)
+        binned[np.ix_(rows, targets)] = np.add.reduceat(power, starts, axis=1)
+    return binned
+
+def pattern_vectors(pipeline, audio_samples, filter_params, sample_rate=22050, spectral_only=False):
+    """(k, D) feature vectors of clips filtered to a detector's band"""
+    vectors = []
+    for audio in audio_samples:
+        _, features = pipeline.features(audio, sample_rate, filter_params, spectral_only)
+        vectors.append(np.asarray(features["feature_vector"], dtype=np.float64))
+    return np.asarray(vectors)
+
+class DetectorStats:
+    """Running per-class power spectra and target pattern moments of one detector"""
+
+    def __init__(self, sample_rate=22050, bin_hz=STATS_BIN_HZ):
+        self.sample_rate = sample_rate
+        self.bin_hz = bin_hz
+        self.freqs = np.arange(int(sample_rate / 2 / bin_hz) + 1) * bin_hz
+        # label -> (weight, mean binned power)
+        self.classes = {}
+        self.pattern_weight = 0.0
+        self.pattern_mean = None
+        self.pattern_m2 = None
+
+    def add_spectra(self, power, labels, forgetting=1.0):
+        """Fold binned power spectra (see binned_power()) into their classes' means"""
+        labels = np.asarray(labels)
+        for label in dict.fromkeys(labels.tolist()):
+            weight, mean = self.classes.get(label, (0.0, np.zeros(len(self.freqs))))
+            weight, mean, _ = _merge(weight, mean, None, power[labels == label], forgetting)
+            self.classes[label] = (weight, mean)
+
+    def add_patterns(self, vectors, forgetting=1.0):
+        """Fold target feature vectors into the Welford pattern moments"""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if not len(vectors):
+            return
+        if self.pattern_mean is None:
+            self.pattern_mean = np.zeros(vectors.shape[1])
+            self.pattern_m2 = np.zeros(vectors.shape[1])
+        self.pattern_weight, self.pattern_mean, self.pattern_m2 = _merge(
+            self.pattern_weight, self.pattern_mean, self.pattern_m2, vectors, forgetting)
+
+    @property
+    def pattern_variance(self):
+        """Weighted per-feature variance of the target patterns"""
+        if not self.pattern_weight:
+            return None
+        return self.pattern_m2 / self.pattern_weight
+
+    def can_fit(self, target):
+        return target in self.classes and any(label != target for label in self.classes)
+
+    def class_means(self, target):
+        """Mean power of the target class and of all other clips, as two pseudo-clips for fit_spectra"""
+        if not self.can_fit(target):
+            raise ValueError("Statistics need both '%s' and other examples" % target)
+        others = [(weight, mean) for label, (weight, mean) in self.classes.items() if label != target]
+        other_weight = sum(weight for weight, _ in others)
+        other_mean = sum(weight * mean for weight, mean in others) / other_weight
+        return np.stack([self.classes[target][1], other_mean]), [target, None]
+
+    def save(self, path):
+        """Write the statistics to a temporary .npz next to path, then move it into place"""
+        labels = list(self.classes)
+        arrays = {
+            "format": np.array(STATS_FORMAT),
+            "sample_rate": np.array(self.sample_rate),
+            "bin_hz": np.array(self.bin_hz),
+            "labels": np.array(labels, dtype=str),
+            "class_weight": np.array([self.classes[label][0] for label in labels], dtype=np.float64),
+            "class_power": np.array([self.classes[label][1] for label in labels], dtype=np.float64).reshape(
+                len(labels), len(self.freqs)),
+            "pattern_weight": np.array(self.pattern_weight)
+        }
+        if self.pattern_mean is not None:
+            arrays["pattern_mean"] = self.pattern_mean
+            arrays["pattern_m2"] = self.pattern_m2
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".%s." % os.path.basename(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["format"]) != STATS_FORMAT:
+                raise ValueError("Unsupported statistics format %r in %s" % (int(data["format"]), path))
+            stats = cls(int(data["sample_rate"]), float(data["bin_hz"]))
+            for label, weight, mean in zip(data["labels"].tolist(), data["class_weight"], data["class_power"]):
+                stats.classes[label] = (float(weight), mean)
+            stats.pattern_weight = float(data["pattern_weight"])
+            if "pattern_mean" in data:
+                stats.pattern_mean = data["pattern_mean"]
+                stats.pattern_m2 = data["pattern_m2"]
+        return stats
+
+def stats_path(name, store_path="models"):
+    return os.path.join(store_path, "stats", "%s.npz" % name)
+
+def record_training_stats(models, audio_samples, labels, store_path="models", sample_rate=22050,
+                          spectrum_cache=None):
+    """Write fresh statistics for trained models from their training clips"""
+    stats = {name: DetectorStats(sample_rate) for name in models}
+    with SoundHunterPipeline("inprocess", spectrum_cache=spectrum_cache) as pipeline:
+        for start in range(0, len(audio_samples), STATS_CHUNK):
+            chunk = audio_samples[start:start + STATS_CHUNK]
+            chunk_labels = labels[start:start + STATS_CHUNK]
+            power = binned_power(chunk, sample_rate, spectrum_cache=spectrum_cache)
+            for name, model in models.items():
+                target = model.get("sound_type", name)
+                stats[name].add_spectra(power, chunk_labels)
+                stats[name].add_patterns(pattern_vectors(
+                    pipeline, [audio for audio, label in zip(chunk, chunk_labels) if label == target],
+                    model["filter_params"], sample_rate, feature_mode(model) == "spectral"))
+    for name in models:
+        stats[name].save(stats_path(name, store_path))
+    return stats
+
+def update_model(name, new_clips, labels, forgetting=1.0, sample_rate=22050, store_path="models",
+                 json_path="trained_models.json", refit=True, max_iter=300, spectrum_cache=None):
+    """Refine a stored detector with new labeled clips; returns the updated model
+
+    The new clips are folded into the detector's statistics. The band is
+    then re-fit from the class means (starting at the current band) when
+    the statistics hold both target and other clips, and the target
+    pattern becomes the running mean of the target feature vectors. The
+    new version is appended to the model store and re-exported to
+    json_path. A detector without statistics (trained before they were
+    recorded) starts from its stored pattern, counted as one clip.
+    """
+    if not 0.0 < forgetting <= 1.0:
+        raise ValueError("forgetting must be in (0, 1], got %r" % forgetting)
+    if len(new_clips) != len(labels):
+        raise ValueError("Got %d clips but %d labels" % (len(new_clips), len(labels)))
+
+    store = ModelStore(store_path)
+    if not len(store) and os.path.exists(json_path):
+        store.import_json(json_path)
+    if name not in store:
+        raise ValueError("No model '%s' in %s" % (name, store_path))
+    model = store[name]
+    target = model["sound_type"]
+
+    path = stats_path(name, store_path)
+    if os.path.exists(path):
+        stats = DetectorStats.load(path)
+        if stats.sample_rate != sample_rate:
+            raise ValueError("Statistics of '%s' are at %d Hz, got %d Hz clips" % (name, stats.sample_rate, sample_rate))
+    else:
+        stats = DetectorStats(sample_rate)
+        stats.add_patterns(np.asarray(model["target_pattern"])[None, :])
+
+    stats.add_spectra(binned_power(new_clips, sample_rate, stats.bin_hz, spectrum_cache), labels, forgetting)
+
+    filter_params = model["filter_params"]
+    if refit and stats.can_fit(target):
+        power, fit_labels = stats.class_means(target)
+        band = (filter_params["low_freq"], filter_params["high_freq"])
+        result = BandTrainer(sample_rate=sample_rate, max_iter=max_iter).fit_spectra(
+            power, stats.freqs, fit_labels, target, band)
+        filter_params = result["filter_params"]
+
+    with SoundHunterPipeline("inprocess", spectrum_cache=spectrum_cache) as pipeline:
+        vectors = pattern_vectors(pipeline, [audio for audio, label in zip(new_clips, labels) if label == target],
+                                  filter_params, sample_rate, feature_mode(model) == "spectral")
+    stats.add_patterns(vectors, forgetting)
+
+    updated = {
+        "filter_params": filter_params,
+        "target_pattern": stats.pattern_mean.tolist(),
+        "sound_type": target,
+        "features": feature_mode(model)
+    }
+    # Statistics first: a crash before the store is written leaves them ahead, never behind
+    stats.save(path)
+    store.save({name: updated})
+    store.export_json(json_path)
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Update a trained detector with freshly generated clips")
+    parser.add_argument("name", help="model to update")
+    parser.add_argument("--clips", type=int, default=5, help="new clips per class")
+    parser.add_argument("--classes", nargs="+", default=list(SOUND_CLASSES), choices=SOUND_CLASSES)
+    parser.add_argument("--start", type=int, default=1000,
+                        help="index of the first generated clip, past the training clips")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--freq-jitter", type=float, default=0.0, help="relative frequency jitter")
+    parser.add_argument("--snr", type=float, nargs=2, metavar=("LOW", "HIGH"),
+                        help="add white noise at an SNR drawn from [LOW, HIGH] dB")
+    parser.add_argument("--forgetting", type=float, default=1.0,
+                        help="weight kept by earlier clips per new clip of their class (1 = never forget)")
+    parser.add_argument("--no-refit", action="store_true", help="keep the current band")
+    args = parser.parse_args()
+
+    clips = np.concatenate([generate_batch(sound, args.clips, seed=args.seed, start=args.start,
+                                           freq_jitter=args.freq_jitter, snr_db=args.snr)
+                            for sound in args.classes])
+    labels = [sound for sound in args.classes for _ in range(args.clips)]
+
+    before = ModelStore()
+    old = before[args.name] if args.name in before else None
+    start = time.perf_counter()
+    model = update_model(args.name, clips, labels, forgetting=args.forgetting, refit=not args.no_refit)
+    elapsed = time.perf_counter() - start
+
+    stats = DetectorStats.load(stats_path(args.name))
+    print("Updated '%s' with %d clips in %.1f ms" % (args.name, len(clips), elapsed * 1000))
+    if old is not None:
+        print("  band:    %.0f-%.0f Hz -> %.0f-%.0f Hz" % (
+            old["filter_params"]["low_freq"], old["filter_params"]["high_freq"],
+            model["filter_params"]["low_freq"], model["filter_params"]["high_freq"]))
+        print("  pattern moved by %.4g" % np.linalg.norm(np.asarray(model["target_pattern"]) - old["target_pattern"]))
+    print("  weights: %s" % ", ".join("%s %.1f" % (label, weight) for label, (weight, _) in sorted(stats.classes.items())))
+
+if __name__ == "__main__":
+    main()
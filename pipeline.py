@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Filter -> features -> detector pipeline with selectable execution backend.
+
+"inprocess" imports the three tesseract_api modules and calls their apply
+functions directly, passing NumPy arrays between stages. "containers"
+opens each Tesseract image once and reuses it for every call until the
+pipeline is closed. "pool" connects to long-lived containers shared by
+every script (component_pool.py), starting them only if none is running.
+All validate inputs and outputs through the same component schemas, so
+they return identical results.
+"""
+
+import contextlib
+import importlib.util
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+import array_transport
+from metrics import get_metrics
+
+metrics = get_metrics("pipeline")
+
+COMPONENTS_DIR = Path(__file__).resolve().parent / "components"
+
+COMPONENT_IMAGES = {
+    "audio_filter": "audio-filter:latest",
+    "feature_extractor": "feature-extractor:latest",
+    "pattern_detector": "pattern-detector:latest"
+}
+
+# Backend used by the scripts unless SOUND_HUNTER_BACKEND says otherwise
+DEFAULT_BACKEND = os.environ.get("SOUND_HUNTER_BACKEND", "containers")
+
+# In-process-only entry points beyond apply, and their (input, output) schema names.
+# Served apply takes the batch fields (audio-filter bands, pattern-detector banks)
+BATCH_ENDPOINTS = {
+    "search_bank": ("SearchInputSchema", "SearchOutputSchema")
+}
+
+# Feature extraction modes a model can be trained in: from the filtered signal's
+# frames, or from audio-filter's masked magnitude spectrum (no inverse FFT)
+FEATURE_MODES = ("framed", "spectral")
+
+_loaded_components = {}
+
+def load_component(name):
+    """Import a component's tesseract_api module in-process"""
+    module = _loaded_components.get(name)
+    if module is None:
+        path = COMPONENTS_DIR / name / "tesseract_api.py"
+        spec = importlib.util.spec_from_file_location("%s_tesseract_api" % name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        # Components loaded after metrics.enable() follow the current setting
+        module.metrics.enabled = metrics.enabled
+        _loaded_components[name] = module
+    return module
+
+class InProcessBackend:
+    """Call the component apply functions directly in this process"""
+
+    supports_batch = True
+
+    def __init__(self, spectrum_cache=None):
+        self.modules = {name: load_component(name) for name in COMPONENT_IMAGES}
+        # Whole-clip FFTs in audio-filter read through the cache until close()
+        self.spectrum_cache = spectrum_cache
+        if spectrum_cache is not None:
+            self.modules["audio_filter"].set_spectrum_cache(spectrum_cache)
+
+    def apply(self, name, inputs):
+        module = self.modules[name]
+        # Validate both ways like the Tesseract runtime does, so results
+        # match the container backend exactly
+        with metrics.timer("validate"):
+            validated = module.InputSchema.model_validate(inputs)
+        result = module.apply(validated)
+        with metrics.timer("validate"):
+            return module.OutputSchema.model_validate(result).model_dump()
+
+    def call(self, name, endpoint, inputs):
+        """Call one of a component's batch functions (see BATCH_ENDPOINTS)"""
+        module = self.modules[name]
+        input_schema, output_schema = (getattr(module, schema) for schema in BATCH_ENDPOINTS[endpoint])
+        with metrics.timer("validate"):
+            validated = input_schema.model_validate(inputs)
+        result = getattr(module, endpoint)(validated)
+        with metrics.timer("validate"):
+            return output_schema.model_validate(result).model_dump()
+
+    def close(self):
+        if self.spectrum_cache is not None:
+            self.modules["audio_filter"].set_spectrum_cache(None)
+            self.spectrum_cache = None
+
+class ContainerBackend:
+    """Open each component image once and reuse it for the whole run"""
+
+    # The Tesseract runtime only serves apply/jacobian/...; no extra endpoints
+    supports_batch = False
+
+    def __init__(self, images=None):
+        import tesseract_core
+
+        self._stack = contextlib.ExitStack()
+        self.tesseracts = {}
+        try:
+            for name, image in (images or COMPONENT_IMAGES).items():
+                self.tesseracts[name] = self._stack.enter_context(
+                    tesseract_core.Tesseract.from_image(image)
+                )
+        except BaseException:
+            self._stack.close()
+            raise
+
+    def apply(self, name, inputs):
+        return array_transport.apply(self.tesseracts[name], inputs)
+
+    def close(self):
+        self._stack.close()
+
+class PoolBackend:
+    """Use the warm containers of component_pool, shared across scripts and left running"""
+
+    supports_batch = False
+
+    def __init__(self, images=None):
+        from component_pool import ComponentPool
+
+        self.pool = ComponentPool(images).start()
+
+    def apply(self, name, inputs):
+        return self.pool.apply(name, inputs)
+
+    def close(self):
+        # The containers outlive the pipeline; `python component_pool.py stop` removes them
+        pass
+
+BACKENDS = {
+    "inprocess": InProcessBackend,
+    "containers": ContainerBackend,
+    "pool": PoolBackend
+}
+
+def _add_timing(timings, stage, start):
+    """Add the time since start to timings[stage]; returns the current time"""
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + (now - start)
+    return now
+
+def model_bands(models):
+    """(low_freq, high_freq) of every model, (M, 2), in the models' order"""
+    return np.array([[model["filter_params"]["low_freq"], model["filter_params"]["high_freq"]]
+                     for model in models.values()], dtype=np.float32)
+
+def feature_mode(model):
+    """How a model's target pattern was extracted: "framed" (default) or "spectral" (see run)"""
+    mode = model.get("features", "framed")
+    if mode not in FEATURE_MODES:
+        raise ValueError("Unknown feature mode '%s', expected one of %s" % (mode, FEATURE_MODES))
+    return mode
+
+class SoundHunterPipeline:
+    """Chain audio-filter, feature-extractor and pattern-detector"""
+
+    def __init__(self, backend=DEFAULT_BACKEND, spectrum_cache=None):
+        """spectrum_cache (a corpus_cache.SpectralCorpusCache) is only usable in-process"""
+        if backend not in BACKENDS:
+            raise ValueError("Unknown backend '%s', expected one of %s" % (backend, sorted(BACKENDS)))
+        self.backend_name = backend
+        if spectrum_cache is None:
+            self.backend = BACKENDS[backend]()
+        elif backend == "inprocess":
+            self.backend = InProcessBackend(spectrum_cache)
+        else:
+            raise ValueError("A spectrum cache needs the inprocess backend, not '%s'" % backend)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.backend.close()
+
+    def filter(self, audio, sample_rate, filter_params, **options):
+        """Run audio-filter; options are extra InputSchema fields (e.g. return_spectrum)"""
+        return self.backend.apply("audio_filter", dict(options, **{
+            "audio_data": np.asarray(audio, dtype=np.float32),
+            "sample_rate": sample_rate,
+            "filter_params": filter_params
+        }))
+
+    def extract(self, filtered_audio, sample_rate, **options):
+        """Run feature-extractor on filtered audio, or on a magnitude_spectrum option"""
+        inputs = dict(options, sample_rate=sample_rate)
+        if filtered_audio is not None:
+            inputs["filtered_audio"] = filtered_audio
+        return self.backend.apply("feature_extractor", inputs)
+
+    def detect(self, feature_vector, target_pattern, detection_threshold=0.8):
+        return self.backend.apply("pattern_detector", {
+            "feature_vector": feature_vector,
+            "target_pattern": np.asarray(target_pattern, dtype=np.float32),
+            "detection_threshold": detection_threshold
+        })
+
+    def features(self, audio, sample_rate, filter_params, spectral_only=False, decimate=False):
+        """Run audio-filter and feature-extractor on one clip; returns both outputs
+
+        See run for spectral_only and decimate.
+        """
+        filter_options = {"decimate": True} if decimate else {}
+        extract_options = {"reference_sample_rate": sample_rate} if decimate else {}
+        if spectral_only:
+            filter_result = self.filter(audio, sample_rate, filter_params, return_filtered_audio=False,
+                                        return_spectrum=True, **filter_options)
+            # Decimating by factor keeps ceil(n / factor) samples
+            factor = sample_rate // filter_result["sample_rate"]
+            feature_result = self.extract(None, filter_result["sample_rate"],
+                                          magnitude_spectrum=filter_result["magnitude_spectrum"],
+                                          signal_length=-(-len(audio) // factor), **extract_options)
+        else:
+            filter_result = self.filter(audio, sample_rate, filter_params, **filter_options)
+            feature_result = self.extract(filter_result["filtered_audio"], filter_result["sample_rate"],
+                                          **extract_options)
+        return filter_result, feature_result
+
+    def run(self, audio, sample_rate, filter_params, target_pattern, detection_threshold=0.8,
+            spectral_only=False, decimate=False):
+        """Run one clip through all three stages and return every stage's output
+
+        With spectral_only, audio-filter hands its masked magnitude spectrum
+        straight to feature-extractor, skipping the filter's inverse FFT and
+        the extractor's forward FFT. Its feature vectors differ from the
+        framed ones, so models must be trained in the same mode (their
+        "features" entry, see feature_mode).
+
+        With decimate, audio-filter downsamples the clip to the lowest rate
+        that covers the band, and features are extracted from the shorter
+        signal on the original rate's scale (reference_sample_rate).
+        """
+        filter_result, feature_result = self.features(audio, sample_rate, filter_params,
+                                                      spectral_only, decimate)
+        detection_result = self.detect(feature_result["feature_vector"], target_pattern, detection_threshold)
+        return {
+            "filter": filter_result,
+            "features": feature_result,
+            "detection": detection_result
+        }
+
+    def search_patterns(self, feature_vectors, target_patterns, k=5, detection_threshold=0.8, n_probe=None):
+        """Top-k rows of a large pattern bank for each feature vector
+
+        In-process this queries pattern-detector's PatternIndex for the
+        bank, built once per bank content; the container backend scores
+        every pattern with detect() and keeps the best k. Returns
+        (rows, scores, is_match), each (N, k).
+        """
+        feature_vectors = np.atleast_2d(np.asarray(feature_vectors, dtype=np.float32))
+        target_patterns = np.asarray(target_patterns, dtype=np.float32)
+        if self.backend.supports_batch:
+            result = self.backend.call("pattern_detector", "search_bank", {
+                "feature_vectors": feature_vectors,
+                "target_patterns": target_patterns,
+                "k": k,
+                "n_probe": n_probe,
+                "detection_threshold": detection_threshold
+            })
+            return (np.asarray(result["pattern_rows"]), np.asarray(result["similarity_scores"]),
+                    np.asarray(result["is_match"]))
+        scores = np.array([[self.detect(vector, pattern, detection_threshold)["similarity_score"]
+                            for pattern in target_patterns] for vector in feature_vectors])
+        rows = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        top = np.take_along_axis(scores, rows, axis=1)
+        return rows, top, top > detection_threshold
+
+    def band_energies(self, audio, sample_rate, models):
+        """Filter energy of the clip in every model's band, (M,), and the clip's peak frequency
+
+        Only audio-filter runs, once, through every band with one FFT and
+        without its inverse FFTs.
+        """
+        if not models:
+            return np.zeros(0), 0.0
+        bands = model_bands(models)
+        result = self.filter(audio, sample_rate, models[next(iter(models))]["filter_params"],
+                             bands=bands, return_filtered_audio=False)
+        return np.asarray(result["band_energy"]), float(result["peak_frequency"])
+
+    def detect_all(self, audio, sample_rate, models, detection_threshold=0.8, timings=None):
+        """Score one clip against every model; returns {name: (is_match, confidence)}
+
+        The clip is filtered through all model bands in one audio-filter
+        call (one FFT) per feature mode and the per-band features are
+        scored against the whole pattern bank in one pattern-detector call
+        (one matrix multiply), on every backend. Spectral models take their
+        features from the masked magnitude spectra, so no inverse FFT runs
+        for them. If timings is a dict, seconds spent
+        per stage are added to its "filter", "features" and "detect" entries.
+        """
+        timings = {} if timings is None else timings
+        names = list(models)
+        if not names:
+            return {}
+
+        feature_vectors = [None] * len(names)
+        for mode in FEATURE_MODES:
+            rows = [k for k, name in enumerate(names) if feature_mode(models[name]) == mode]
+            if not rows:
+                continue
+            spectral = mode == "spectral"
+            start = time.perf_counter()
+            filtered = self.filter(audio, sample_rate, models[names[rows[0]]]["filter_params"],
+                                   bands=model_bands({names[k]: models[names[k]] for k in rows}),
+                                   return_filtered_audio=not spectral, return_spectrum=spectral)
+            start = _add_timing(timings, "filter", start)
+            if spectral:
+                for k, magnitude in zip(rows, filtered["band_magnitude_spectrum"]):
+                    feature_vectors[k] = self.extract(None, filtered["sample_rate"], magnitude_spectrum=magnitude,
+                                                      signal_length=len(audio))["feature_vector"]
+            else:
+                for k, band_audio in zip(rows, filtered["band_filtered_audio"]):
+                    feature_vectors[k] = self.extract(band_audio, filtered["sample_rate"])["feature_vector"]
+            _add_timing(timings, "features", start)
+        feature_vectors = np.stack(feature_vectors)
+        start = time.perf_counter()
+        target_patterns = np.array([models[name]["target_pattern"] for name in names], dtype=np.float32)
+        detection = self.backend.apply("pattern_detector", {
+            "feature_vector": feature_vectors[0],
+            "target_pattern": target_patterns[0],
+            "detection_threshold": detection_threshold,
+            "feature_vectors": feature_vectors,
+            "target_patterns": target_patterns
+        })
+        _add_timing(timings, "detect", start)
+
+        # Row k holds the features seen through model k's band
+        similarity = np.asarray(detection["bank_similarity"])
+        is_match = np.asarray(detection["bank_is_match"])
+        return {name: (bool(is_match[k, k]), max(0.0, min(1.0, float(similarity[k, k]))))
+                for k, name in enumerate(names)}
@@ -119,6 +119,11 @@ pip install -r requirements.txt
 chmod +x build_components.sh
 ./build_components.sh
 
+# Start each component container once; every script below reuses them
+echo "Starting component pool..."
+python component_pool.py start
+export SOUND_HUNTER_BACKEND=pool
+
 echo "Testing Tesseract pipeline..."
 python test_pipeline.py
 
@@ -128,26 +133,8 @@ python train_system.py
 echo "Retraining for demo purpose..."
 python demo_retrain.py
 
-# Cleanup Docker containers to free ports
-echo -e "\n${YELLOW}Cleaning up Docker containers...${NC}"
-
-# Stop and remove containers using conflicting ports
-CONFLICTING_PORTS=(62630 63134)
-for PORT in "${CONFLICTING_PORTS[@]}"; do
-    CONTAINER_ID=$(docker ps --filter "publish=$PORT" --format "{{.ID}}")
-    if [[ -n "$CONTAINER_ID" ]]; then
-        echo -e "${YELLOW}Stopping and removing container using port $PORT...${NC}"
-        docker stop "$CONTAINER_ID" && docker rm "$CONTAINER_ID"
-    fi
-done
-
-# Remove containers based on specific images
-IMAGES=("audio-filter:latest" "feature-extractor:latest" "pattern-detector:latest")
-for IMAGE in "${IMAGES[@]}"; do
-    if docker images | grep -q "$IMAGE"; then
-        echo -e "${YELLOW}Removing containers for image $IMAGE...${NC}"
-        docker ps -aq --filter ancestor="$IMAGE" | xargs docker rm -f 2>/dev/null || true
-    fi
-done
+# The pool knows its containers, so no port or image scavenging is needed
+echo -e "\n${YELLOW}Stopping component pool...${NC}"
+python component_pool.py stop
 
 echo -e "${GREEN}Setup and demo complete!${NC}"
\ No newline at end of file
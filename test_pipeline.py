@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import tesseract_core
 import numpy as np
+from pipeline import SoundHunterPipeline
 
 def generate_test_signal(frequency, duration=2, sample_rate=22050):
     """Generate a test sine wave"""
@@ -21,40 +21,29 @@ def test_pipeline():
     
     print("\nRunning pipeline on 440 Hz test signal...")
     
-    # Use components as context managers
-    with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter:
+    # Open the components once for the whole run
+    with SoundHunterPipeline() as pipeline:
         # Step 1: Filter
         filter_params = {
             "low_freq": 400,
             "high_freq": 500
         }
         
-        filter_result = audio_filter.apply({
-            "audio_data": test_audio.tolist(),
-            "sample_rate": sample_rate,
-            "filter_params": filter_params
-        })
+        filter_result = pipeline.filter(test_audio, sample_rate, filter_params)
         
         print("  Filter applied")
         print("  - Energy: %.2f" % filter_result['filter_energy'])
         print("  - Peak frequency: %.2f Hz" % filter_result['peak_frequency'])
-    
-    with tesseract_core.Tesseract.from_image("feature-extractor:latest") as feature_extractor:
+        
         # Step 2: Extract features
-        feature_result = feature_extractor.apply({
-            "filtered_audio": filter_result["filtered_audio"],
-            "sample_rate": filter_result["sample_rate"]
-        })
+        feature_result = pipeline.extract(filter_result["filtered_audio"], filter_result["sample_rate"])
         
         print("  Features extracted: %d features" % len(feature_result['feature_vector']))
-    
-    with tesseract_core.Tesseract.from_image("pattern-detector:latest") as pattern_detector:
+        
         # Step 3: Pattern detection (comparing to itself for demo)
-        detection_result = pattern_detector.apply({
-            "feature_vector": feature_result["feature_vector"],
-            "target_pattern": feature_result["feature_vector"],
-            "detection_threshold": 0.8
-        })
+        detection_result = pipeline.detect(feature_result["feature_vector"],
+                                           feature_result["feature_vector"],
+                                           detection_threshold=0.8)
         
         print("  Pattern detection complete")
         print("  - Match: %s" % detection_result['is_match'])
@@ -69,7 +58,7 @@ def test_pipeline():
     #             # First try: Use exact nested field names
     #             gradients = audio_filter.jacobian(
     #                 {
-    #                     "audio_data": test_audio.tolist(),
+    #                     "audio_data": test_audio,
     #                     "sample_rate": sample_rate,
     #                     "filter_params": filter_params
     #                 },
@@ -82,7 +71,7 @@ def test_pipeline():
     #             try:
     #                 gradients = audio_filter.jacobian(
     #                     {
-    #                         "audio_data": test_audio.tolist(),
+    #                         "audio_data": test_audio,
     #                         "sample_rate": sample_rate,
     #                         "filter_params": filter_params
     #                     },
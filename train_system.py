@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import tesseract_core
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
-import json
+from pipeline import FEATURE_MODES, SoundHunterPipeline
+from trainer import BandTrainer
+from model_store import ModelStore
+from corpus_cache import SpectralCorpusCache
+from corpus import SOUND_CLASSES, generate_batch, load_corpus
+from online_update import record_training_stats
+import metrics
+
+_metrics = metrics.get_metrics("train_system")
 
 def generate_sound(sound_type, duration=1, sample_rate=22050):
     """Generate different types of sounds for training"""
@@ -45,135 +55,51 @@ def generate_sound(sound_type, duration=1, sample_rate=22050):
     
     return signal
 
-def train_detector(audio_samples, labels, target_sound, epochs=20):
-    """Train the system to detect a specific sound"""
+@_metrics.timed("train_detector")
+def train_detector(audio_samples, labels, target_sound, max_iter=300, seed=0, spectra=None,
+                   spectrum_cache=None, spectral_only=False):
+    """Train the system to detect a specific sound
+
+    With spectral_only the target pattern is extracted from the masked
+    magnitude spectrum (SoundHunterPipeline.run(spectral_only=True)), and
+    the model is marked to be scored that way.
+    """
     print("\nTraining to detect: '%s'" % target_sound)
     print("Training samples: %d" % len(audio_samples))
     print("Positive examples: %d" % labels.count(target_sound))
     
-    # Initialize filter parameters
     # Initialize filter parameters based on sound type
     if target_sound == "motorcycle":
-        filter_params = {
-            "low_freq": 50,    # Start low for engine rumbles
-            "high_freq": 500
-        }
+        init_band = (50, 500)      # Start low for engine rumbles
     elif target_sound == "bird":
-        filter_params = {
-            "low_freq": 800,   # Start high for chirps
-            "high_freq": 2000
-        }
+        init_band = (800, 2000)    # Start high for chirps
     elif target_sound == "whistle":
-        filter_params = {
-            "low_freq": 1000,  # Start mid-high for pure tones
-            "high_freq": 2000
-        }
+        init_band = (1000, 2000)   # Start mid-high for pure tones
     else:
-        filter_params = {
-            "low_freq": 500,   # Default
-            "high_freq": 2000
-        }
-    
-    # Collect target patterns for later detection
-    target_patterns = []
+        init_band = (500, 2000)    # Default
     
-    # Training parameters
-    learning_rate = 50.0
-    best_energy_ratio = 0
-    best_params = filter_params.copy()
+    # Optimize the band over the whole labeled set at once
+    trainer = BandTrainer(max_iter=max_iter, seed=seed, spectrum_cache=spectrum_cache)
+    if spectra is not None:
+        result = trainer.fit_spectra(spectra[0], spectra[1], labels, target_sound, init_band)
+    else:
+        result = trainer.fit(audio_samples, labels, target_sound, init_band)
+    filter_params = result["filter_params"]
     
-    # Load components as context managers
-    with tesseract_core.Tesseract.from_image("audio-filter:latest") as audio_filter, \
-         tesseract_core.Tesseract.from_image("feature-extractor:latest") as feature_extractor:
-        
-        for epoch in range(epochs):
-            total_target_energy = 0
-            total_other_energy = 0
-            target_count = 0
-            other_count = 0
-            
-            for audio, label in zip(audio_samples, labels):
-                # Apply current filter
-                filter_result = audio_filter.apply({
-                    "audio_data": audio.tolist(),
-                    "sample_rate": 22050,
-                    "filter_params": filter_params
-                })
-                
-                energy = filter_result["filter_energy"]
-                
-                # Track energies
-                if label == target_sound:
-                    total_target_energy += energy
-                    target_count += 1
-                    
-                    # Extract features for target sounds
-                    if epoch == epochs - 1:  # Last epoch
-                        features = feature_extractor.apply({
-                            "filtered_audio": filter_result["filtered_audio"],
-                            "sample_rate": filter_result["sample_rate"]
-                        })
-                        target_patterns.append(features["feature_vector"])
-                else:
-                    total_other_energy += energy
-                    other_count += 1
-                
-                # Compute loss
-                if label == target_sound:
-                    loss = -energy  # Want to maximize
-                else:
-                    loss = energy   # Want to minimize
-                
-                # Simple gradient-free optimization
-                # (since jacobian has format issues)
-                if epoch < epochs - 1:  # Don't update on last epoch
-                    # Random walk optimization
-                    if np.random.random() < 0.3:  # 30% chance to explore
-                        # Try random perturbation
-                        delta_low = np.random.uniform(-100, 100)
-                        delta_high = np.random.uniform(-100, 100)
-                        
-                        # Apply perturbation
-                        new_low = filter_params["low_freq"] + delta_low
-                        new_high = filter_params["high_freq"] + delta_high
-                        
-                        # Ensure valid ranges
-                        new_low = max(20, min(8000, new_low))
-                        new_high = max(new_low + 50, min(10000, new_high))
-                        
-                        # Test new parameters
-                        test_result = audio_filter.apply({
-                            "audio_data": audio.tolist(),
-                            "sample_rate": 22050,
-                            "filter_params": {"low_freq": new_low, "high_freq": new_high}
-                        })
-                        
-                        # Accept if better
-                        new_energy = test_result["filter_energy"]
-                        if (label == target_sound and new_energy > energy) or \
-                           (label != target_sound and new_energy < energy):
-                            filter_params["low_freq"] = new_low
-                            filter_params["high_freq"] = new_high
-            
-            # Calculate energy ratio (want high ratio)
-            avg_target = total_target_energy / max(target_count, 1)
-            avg_other = total_other_energy / max(other_count, 1)
-            energy_ratio = avg_target / max(avg_other, 1e-10)
-            
-            # Track best parameters
-            if energy_ratio > best_energy_ratio:
-                best_energy_ratio = energy_ratio
-                best_params = filter_params.copy()
-            
-            if epoch % 5 == 0:
-                print("Epoch %d: Filter: %.0f-%.0f Hz, Energy ratio: %.2f" % 
-                      (epoch, filter_params['low_freq'], filter_params['high_freq'], energy_ratio))
-    
-    # Use best parameters
-    filter_params = best_params
     print("\nTraining complete!")
     print("Optimal filter range: %.0f-%.0f Hz" % (filter_params['low_freq'], filter_params['high_freq']))
-    print("Best energy ratio: %.2f" % best_energy_ratio)
+    print("Best energy ratio: %.2f" % result["energy_ratio"])
+    print("Iterations: %d, mask evaluations: %d, wall time: %.1f ms" %
+          (result["iterations"], result["mask_evaluations"], result["wall_time"] * 1000))
+    
+    # Collect target patterns for later detection
+    target_patterns = []
+    with SoundHunterPipeline("inprocess", spectrum_cache=spectrum_cache) as pipeline:
+        for audio, label in zip(audio_samples, labels):
+            if label != target_sound:
+                continue
+            _, features = pipeline.features(audio, 22050, filter_params, spectral_only)
+            target_patterns.append(features["feature_vector"])
     
     # Calculate average target pattern
     if target_patterns:
@@ -184,59 +110,145 @@ def train_detector(audio_samples, labels, target_sound, epochs=20):
     return {
         "filter_params": filter_params,
         "target_pattern": avg_pattern,
-        "sound_type": target_sound
+        "sound_type": target_sound,
+        "features": "spectral" if spectral_only else "framed"
     }
 
+class SharedCorpus:
+    """Training arrays placed in shared memory so pool workers attach instead of unpickling them"""
+
+    def __init__(self, arrays):
+        self._segments = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+            self._segments.append(segment)
+            self.spec[name] = (segment.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(spec):
+        """Map the shared arrays described by spec; returns (arrays, segments to close)"""
+        arrays = {}
+        segments = []
+        for name, (segment_name, shape, dtype) in spec.items():
+            segment = shared_memory.SharedMemory(name=segment_name)
+            segments.append(segment)
+            arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=segment.buf)
+        return arrays, segments
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+# Per-worker view of the shared corpus, set by _attach_corpus
+_worker_corpus = None
+
+def _attach_corpus(spec, labels):
+    global _worker_corpus
+    arrays, segments = SharedCorpus.attach(spec)
+    # Keep the segments referenced for the lifetime of the worker
+    _worker_corpus = (arrays, segments, labels)
+
+def _train_shared(target_sound, max_iter, seed, spectral_only):
+    arrays, _, labels = _worker_corpus
+    return target_sound, train_detector(arrays["audio"], labels, target_sound, max_iter, seed,
+                                        spectra=(arrays["power"], arrays["freqs"]),
+                                        spectral_only=spectral_only)
+
+def save_models(models, path="trained_models.json", store_path="models"):
+    """Append models to the model store and re-export the JSON model file atomically"""
+    store = ModelStore(store_path)
+    # First run against an existing JSON file: carry its models over
+    if not len(store) and os.path.exists(path):
+        store.import_json(path)
+    store.save(models)
+    store.export_json(path)
+    return store
+
+def train_all(audio_samples, labels, targets, workers=1, max_iter=300, seed=0, spectrum_cache=None,
+              spectral_only=False):
+    """Train one detector per target, fanning out to a process pool when workers > 1"""
+    audio = np.asarray(audio_samples, dtype=np.float32)
+    
+    # Every detector shares the same corpus spectra; compute them once
+    power, freqs = BandTrainer(spectrum_cache=spectrum_cache).spectra(audio)
+    
+    if workers <= 1:
+        models = {}
+        for target_sound in targets:
+            print("\n" + "="*50)
+            print("TRAINING FOR %s DETECTION" % target_sound.upper())
+            print("="*50)
+            models[target_sound] = train_detector(audio, labels, target_sound, max_iter, seed,
+                                                  spectra=(power, freqs), spectrum_cache=spectrum_cache,
+                                                  spectral_only=spectral_only)
+        return models
+    
+    corpus = SharedCorpus({"audio": audio, "power": power, "freqs": freqs})
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_corpus,
+                                 initargs=(corpus.spec, list(labels))) as pool:
+            futures = [pool.submit(_train_shared, target_sound, max_iter, seed, spectral_only)
+                       for target_sound in targets]
+            results = dict(future.result() for future in futures)
+    finally:
+        corpus.close()
+    
+    # Keep the caller's target order regardless of completion order
+    return {target_sound: results[target_sound] for target_sound in targets}
+
 def main():
     print("=== Sound Hunter Training System ===")
     
     # Generate training data
     print("\nGenerating training data...")
     
-    # Create diverse training set
-    bird_sounds = [generate_sound("bird") for _ in range(5)]
-    motorcycle_sounds = [generate_sound("motorcycle") for _ in range(5)]
-    whistle_sounds = [generate_sound("whistle") for _ in range(5)]
-    noise_sounds = [generate_sound("noise") for _ in range(5)]
+    # Create diverse training set: a corpus written by corpus.py, or 5 seeded clips per class
+    corpus_dir = os.environ.get("SOUND_HUNTER_CORPUS")
+    if corpus_dir:
+        all_sounds, labels = load_corpus(corpus_dir)
+    else:
+        all_sounds = np.concatenate([generate_batch(sound, 5) for sound in SOUND_CLASSES])
+        labels = [sound for sound in SOUND_CLASSES for _ in range(5)]
+    print("Training clips: %d" % len(all_sounds))
     
     # Train for different sounds
-    print("\n" + "="*50)
-    print("TRAINING FOR BIRD DETECTION")
-    print("="*50)
-    
-    all_sounds = bird_sounds + motorcycle_sounds + whistle_sounds + noise_sounds
-    labels = (["bird"] * 5 + ["motorcycle"] * 5 + 
-              ["whistle"] * 5 + ["noise"] * 5)
-    
-    bird_model = train_detector(all_sounds, labels, "bird")
-    
-    print("\n" + "="*50)
-    print("TRAINING FOR MOTORCYCLE DETECTION")
-    print("="*50)
-    
-    motorcycle_model = train_detector(all_sounds, labels, "motorcycle")
-    
-    print("\n" + "="*50)
-    print("TRAINING FOR WHISTLE DETECTION")
-    print("="*50)
-    
-    whistle_model = train_detector(all_sounds, labels, "whistle")
+    workers = int(os.environ.get("SOUND_HUNTER_WORKERS", "1"))
+    # "spectral" trains detectors on magnitude-spectrum features, scored without inverse FFTs
+    feature_mode = os.environ.get("SOUND_HUNTER_FEATURES", "framed")
+    if feature_mode not in FEATURE_MODES:
+        raise ValueError("SOUND_HUNTER_FEATURES must be one of %s, got '%s'" % (FEATURE_MODES, feature_mode))
+    # Clip spectra persist across targets and runs; the path can be overridden for scratch runs
+    spectrum_cache = SpectralCorpusCache(os.environ.get("SOUND_HUNTER_SPECTRAL_CACHE", ".spectral_cache"))
+    with metrics.profiled("train_all"):
+        models = train_all(all_sounds, labels, ["bird", "motorcycle", "whistle"], workers=workers,
+                           spectrum_cache=spectrum_cache, spectral_only=feature_mode == "spectral")
+    bird_model = models["bird"]
+    motorcycle_model = models["motorcycle"]
+    whistle_model = models["whistle"]
     
     # Save models
     print("\n" + "="*50)
     print("SAVING TRAINED MODELS")
     print("="*50)
     
-    models = {
-        "bird": bird_model,
-        "motorcycle": motorcycle_model,
-        "whistle": whistle_model
-    }
-    
-    with open("trained_models.json", "w") as f:
-        json.dump(models, f, indent=2)
+    save_models(models)
+    # Sufficient statistics for online_update.update_model
+    record_training_stats(models, all_sounds, labels, spectrum_cache=spectrum_cache)
     
-    print("\n  Models saved to trained_models.json")
+    print("\n  Models saved to models/ and exported to trained_models.json")
+    print("  Update statistics saved to models/stats/")
+    stats = spectrum_cache.stats()
+    print("  Spectral cache: %d clips, %d hits, %d misses" % (stats["entries"], stats["hits"], stats["misses"]))
+    if metrics.METRICS_ENABLED:
+        # Only this process is covered; pool workers keep their own counters
+        with open("training_metrics.json", "w") as f:
+            f.write(metrics.to_json(indent=2))
+        print("  Metrics written to training_metrics.json")
     print("\nSummary:")
     print("Bird detector:       %.0f-%.0f Hz" % (bird_model['filter_params']['low_freq'], bird_model['filter_params']['high_freq']))
     print("Motorcycle detector: %.0f-%.0f Hz" % (motorcycle_model['filter_params']['low_freq'], motorcycle_model['filter_params']['high_freq']))
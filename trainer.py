@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Gradient-based bandpass training over a whole labeled set at once.
+
+Every clip is transformed once; after that each optimizer step is a pair
+of matrix-vector products between the clips' power spectra and the
+(sigmoid-edged) band mask and its derivatives, using the same mask and
+Parseval weighting as audio-filter's apply and jacobian.
+"""
+
+import time
+
+import numpy as np
+
+from pipeline import load_component
+from metrics import get_metrics
+
+metrics = get_metrics("trainer")
+
+# Valid cutoff range of audio-filter's FilterParameters
+MIN_FREQ = 20.0
+MAX_FREQ = 10000.0
+
+class BandTrainer:
+    """Optimize (low_freq, high_freq) so target clips keep their energy and others lose it"""
+
+    OBJECTIVES = ("energy_ratio", "margin")
+
+    def __init__(self, sample_rate=22050, objective="energy_ratio", margin=1.0,
+                 edge_width=10.0, learning_rate=10.0, max_iter=300, patience=20,
+                 tol=1e-4, min_bandwidth=50.0, restarts=4, seed=0, spectrum_cache=None):
+        if objective not in self.OBJECTIVES:
+            raise ValueError("Unknown objective '%s', expected one of %s" % (objective, self.OBJECTIVES))
+        self.sample_rate = sample_rate
+        self.objective = objective
+        self.margin = margin
+        self.edge_width = edge_width
+        self.learning_rate = learning_rate
+        self.max_iter = max_iter
+        self.patience = patience
+        self.tol = tol
+        self.min_bandwidth = min_bandwidth
+        self.restarts = restarts
+        self.seed = seed
+        self.spectrum_cache = spectrum_cache
+        self.audio_filter = load_component("audio_filter")
+        # Band masks (with or without derivatives) evaluated by the last fit
+        self.mask_evaluations = 0
+
+    @metrics.timed("spectra")
+    def spectra(self, audio_samples):
+        """Parseval-weighted power spectra of all clips, (N, F), and their frequency grid"""
+        audio_batch = np.asarray(audio_samples, dtype=np.float32)
+        n = audio_batch.shape[1]
+        if self.spectrum_cache is not None:
+            fft = self.spectrum_cache.rfft_batch(audio_batch, self.sample_rate)
+        else:
+            fft = np.fft.rfft(audio_batch, axis=1)
+        freqs = np.fft.rfftfreq(n, 1/self.sample_rate)
+        return self.audio_filter.parseval_power(fft, n), freqs
+
+    def _project(self, band):
+        low = min(max(band[0], MIN_FREQ), MAX_FREQ - self.min_bandwidth)
+        high = min(max(band[1], low + self.min_bandwidth), MAX_FREQ)
+        return np.array([low, high])
+
+    @metrics.timed("objective")
+    def _objective(self, power, freqs, is_target, band):
+        """Objective to maximize and its gradient with respect to (low_freq, high_freq)"""
+        mask, d_low, d_high = self.audio_filter.band_mask_gradients(
+            freqs, band[0], band[1], self.edge_width
+        )
+        self.mask_evaluations += 1
+        energy = power @ (mask * mask) + 1e-12
+        grad = power @ np.stack([2 * mask * d_low, 2 * mask * d_high], axis=1)
+
+        if self.objective == "energy_ratio":
+            # log(mean target energy) - log(mean other energy)
+            target_energy = energy[is_target].mean()
+            other_energy = energy[~is_target].mean()
+            value = np.log(target_energy) - np.log(other_energy)
+            gradient = (grad[is_target].mean(axis=0) / target_energy
+                        - grad[~is_target].mean(axis=0) / other_energy)
+            return value, gradient
+
+        # Margin: every target clip should beat every other clip by `margin` in log energy
+        log_energy = np.log(energy)
+        log_grad = grad / energy[:, None]
+        gaps = log_energy[is_target][:, None] - log_energy[~is_target][None, :]
+        active = (gaps < self.margin).astype(np.float64)
+        value = -np.mean(np.maximum(self.margin - gaps, 0.0))
+        pair_count = active.size
+        gradient = (active.sum(axis=1) @ log_grad[is_target]
+                    - active.sum(axis=0) @ log_grad[~is_target]) / pair_count
+        return value, gradient
+
+    def _ascend(self, power, freqs, is_target, band):
+        """Adam ascent from one starting band with early stopping"""
+        band = self._project(np.asarray(band, dtype=np.float64))
+        first_moment = np.zeros(2)
+        second_moment = np.zeros(2)
+        beta1, beta2 = 0.9, 0.999
+
+        best_value = -np.inf
+        best_band = band.copy()
+        stale = 0
+        iterations = 0
+        for step in range(1, self.max_iter + 1):
+            iterations = step
+            value, gradient = self._objective(power, freqs, is_target, band)
+            if value > best_value + self.tol:
+                best_value = value
+                best_band = band.copy()
+                stale = 0
+            else:
+                stale += 1
+                if stale >= self.patience:
+                    break
+
+            first_moment = beta1 * first_moment + (1 - beta1) * gradient
+            second_moment = beta2 * second_moment + (1 - beta2) * gradient ** 2
+            m_hat = first_moment / (1 - beta1 ** step)
+            v_hat = second_moment / (1 - beta2 ** step)
+            band = self._project(band + self.learning_rate * m_hat / (np.sqrt(v_hat) + 1e-12))
+
+        return best_band, best_value, iterations
+
+    def energy_ratio(self, power, freqs, is_target, band):
+        """Mean target over mean other energy under audio-filter's brick-wall mask"""
+        mask = self.audio_filter.band_mask(freqs, band[0], band[1])
+        self.mask_evaluations += 1
+        energy = power @ mask.astype(np.float64)
+        return float(energy[is_target].mean() / max(energy[~is_target].mean(), 1e-10))
+
+    def fit(self, audio_samples, labels, target_sound, init_band):
+        """Train one detector band; returns the band plus timing and mask-evaluation statistics"""
+        start = time.perf_counter()
+        power, freqs = self.spectra(audio_samples)
+        result = self.fit_spectra(power, freqs, labels, target_sound, init_band)
+        result["wall_time"] = time.perf_counter() - start
+        return result
+
+    @metrics.timed("fit")
+    def fit_spectra(self, power, freqs, labels, target_sound, init_band):
+        """Train one detector band from precomputed power spectra (see spectra())"""
+        start = time.perf_counter()
+        self.mask_evaluations = 0
+
+        is_target = np.array([label == target_sound for label in labels])
+        if not is_target.any() or is_target.all():
+            raise ValueError("Training set needs both '%s' and other examples" % target_sound)
+
+        # Deterministic restarts: the given band first, then seeded random bands
+        rng = np.random.default_rng(self.seed)
+        starts = [np.asarray(init_band, dtype=np.float64)]
+        for _ in range(self.restarts - 1):
+            low = rng.uniform(MIN_FREQ, MAX_FREQ / 2)
+            starts.append(np.array([low, low + rng.uniform(self.min_bandwidth, 2000.0)]))
+
+        best = None
+        total_iterations = 0
+        for band in starts:
+            band, value, iterations = self._ascend(power, freqs, is_target, band)
+            total_iterations += iterations
+            metrics.increment("iterations", iterations)
+            if best is None or value > best[1]:
+                best = (band, value)
+
+        band, value = best
+        return {
+            "filter_params": {"low_freq": float(band[0]), "high_freq": float(band[1])},
+            "objective": float(value),
+            "energy_ratio": self.energy_ratio(power, freqs, is_target, band),
+            "iterations": total_iterations,
+            "mask_evaluations": self.mask_evaluations,
+            "wall_time": time.perf_counter() - start
+        }